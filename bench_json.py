@@ -0,0 +1,77 @@
+"""Per-row cost of encoding a catalog page: FastAPI's default response_model
+path versus fastjson.dump_json.
+
+    python bench_json.py [rows] [repeat]
+"""
+import asyncio
+import sys
+import time
+from types import SimpleNamespace
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from fastjson import dump_json
+from schemas import BookOut
+
+
+def make_rows(count: int) -> list:
+    # stand-ins for the Row objects get_books selects
+    return [
+        SimpleNamespace(
+            book_id=i,
+            title=f"Book title {i}",
+            author_name=f"Author {i % 500}",
+            rating=(i % 50) / 10,
+            price=100 + i % 900,
+            cover_photo=f"uploads/cover_{i}.jpg",
+            categories="Horror",
+            stock=i % 20,
+            description="A reasonably long description of the book. " * 4,
+            publish_year=1950 + i % 75,
+            review_count=i % 40,
+            average_rating=(i % 50) / 10,
+            rating_1=1, rating_2=2, rating_3=3, rating_4=4, rating_5=5,
+        )
+        for i in range(count)
+    ]
+
+
+def default_path(field, rows) -> bytes:
+    # what FastAPI does with response_model=List[BookOut]: validate, dump to
+    # Python objects, then json.dumps in JSONResponse.render
+    content = asyncio.run(serialize_response(field=field, response_content=rows))
+    return JSONResponse(content).body
+
+
+def fast_path(rows) -> bytes:
+    return dump_json(List[BookOut], rows)
+
+
+def timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    rows = make_rows(count)
+    field = create_model_field(name="Response_bench", type_=List[BookOut], mode="serialization")
+
+    before = timed(lambda: default_path(field, rows), repeat)
+    after = timed(lambda: fast_path(rows), repeat)
+    print(f"{count} rows, best of {repeat}")
+    print(f"response_model + JSONResponse: {before * 1e3:8.1f} ms  {before / count * 1e6:6.2f} us/row")
+    print(f"fastjson.dump_json:            {after * 1e3:8.1f} ms  {after / count * 1e6:6.2f} us/row")
+    print(f"speedup: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
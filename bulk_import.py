@@ -0,0 +1,247 @@
+import asyncio
+import codecs
+import csv
+import json
+import zlib
+from collections import deque
+
+from pydantic import ValidationError, field_validator
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from model import BookStore, CategoryEnum
+from schemas import BookCreate
+
+
+# Bulk catalog import. The request body is read chunk by chunk, split into
+# records, validated one at a time and loaded IMPORT_BATCH_SIZE rows at a
+# time (COPY on Postgres, executemany elsewhere), so memory is bounded by the
+# batch size whatever the upload size. Invalid rows are reported by line
+# number and skipped; they never abort the import.
+
+IMPORT_COLUMNS = list(BookCreate.model_fields)
+
+# accepted spellings: the enum name ("sci_Fi") or its label ("Sci-Fi"), any case
+CATEGORY_LOOKUP = {}
+for member in CategoryEnum:
+    CATEGORY_LOOKUP[member.name.lower()] = member
+    CATEGORY_LOOKUP[member.value.lower()] = member
+
+
+class BookImportRow(BookCreate):
+    categories: CategoryEnum
+
+    @field_validator("categories", mode="before")
+    @classmethod
+    def known_category(cls, value):
+        if isinstance(value, str) and value.strip().lower() in CATEGORY_LOOKUP:
+            return CATEGORY_LOOKUP[value.strip().lower()]
+        return value
+
+
+async def decompressed(chunks):
+    # gzip (or zlib) framing is detected from the header
+    decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 32)
+    async for chunk in chunks:
+        data = decompressor.decompress(chunk)
+        if data:
+            yield data
+    yield decompressor.flush()
+
+
+async def line_batches(chunks):
+    # Complete text lines, one list per network chunk.
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        lines = (pending + decoder.decode(chunk)).split("\n")
+        pending = lines.pop()
+        if lines:
+            yield lines
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield [pending]
+
+
+class _NeedMore(Exception):
+    pass
+
+
+class _LineFeed:
+    # The lines one csv.reader reads, appended as chunks arrive. Running dry
+    # raises _NeedMore rather than StopIteration, which the reader would take
+    # for the end of the file. The reader drops a half-read record when its
+    # input fails, so rewind() puts that record's lines back to be read again
+    # once the next chunk is in.
+    def __init__(self):
+        self.pending = deque()
+        self.record = []
+        self.refed = 0
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.pending:
+            if self.closed:
+                raise StopIteration
+            raise _NeedMore
+        line = self.pending.popleft()
+        self.record.append(line)
+        return line
+
+    def rewind(self):
+        self.refed += len(self.record)
+        self.pending.extendleft(reversed(self.record))
+        self.record = []
+
+
+def _csv_rows(reader, feed):
+    # (first line number, values or error message) for every record the
+    # buffered lines complete
+    while True:
+        start = reader.line_num - feed.refed + 1
+        feed.record = []
+        try:
+            values = next(reader)
+        except _NeedMore:
+            feed.rewind()
+            return
+        except StopIteration:
+            return
+        except csv.Error as error:
+            yield start, f"Malformed CSV: {error}"
+            continue
+        if values:
+            yield start, values
+
+
+async def _fed(batches, feed):
+    async for lines in batches:
+        feed.pending.extend(line + "\n" for line in lines)
+        yield
+    # whatever is still buffered is the last record, complete or not
+    feed.closed = True
+    yield
+
+
+async def csv_records(batches):
+    # (line number, dict or error message). One csv.reader parses the whole
+    # upload, so quoting follows the csv module's rules exactly.
+    feed = _LineFeed()
+    reader = csv.reader(feed, strict=True)
+    header = None
+    async for _ in _fed(batches, feed):
+        for number, values in _csv_rows(reader, feed):
+            if header is None:
+                if isinstance(values, str):
+                    yield number, values
+                    return
+                header = [name.strip() for name in values]
+                missing = [name for name in IMPORT_COLUMNS if name not in header]
+                if missing:
+                    yield number, f"Header is missing columns: {', '.join(missing)}"
+                    return
+            elif isinstance(values, str):
+                yield number, values
+            elif len(values) != len(header):
+                yield number, f"Expected {len(header)} fields, got {len(values)}"
+            else:
+                yield number, dict(zip(header, values))
+
+
+async def ndjson_records(batches):
+    line_no = 0
+    async for lines in batches:
+        for line in lines:
+            line_no += 1
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as error:
+                yield line_no, f"Invalid JSON: {error}"
+                continue
+            if not isinstance(record, dict):
+                yield line_no, "Expected a JSON object"
+                continue
+            yield line_no, record
+
+
+def validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc']) or 'row'}: {detail['msg']}"
+        for detail in error.errors(include_url=False)
+    )
+
+
+# executemany fallback (SQLite); the ORM's per-row parameter processing would
+# cost more than the insert itself
+INSERT_SQL = "INSERT INTO bookstore ({}) VALUES ({})".format(", ".join(IMPORT_COLUMNS), ", ".join("?" * len(IMPORT_COLUMNS)))
+
+
+def import_record(row: BookImportRow) -> tuple:
+    # IMPORT_COLUMNS order; the categories enum is stored by member name, as
+    # SQLAlchemy does
+    return tuple(row.categories.name if name == "categories" else getattr(row, name) for name in IMPORT_COLUMNS)
+
+
+async def load_batch(db: AsyncSession, records: list):
+    # Straight to the driver on the session's connection and transaction.
+    connection = (await (await db.connection()).get_raw_connection()).driver_connection
+    if db.bind.dialect.name == "postgresql":
+        await connection.copy_records_to_table(BookStore.__tablename__, records=records, columns=IMPORT_COLUMNS)
+    else:
+        await connection.executemany(INSERT_SQL, records)
+
+
+async def import_books(db: AsyncSession, chunks, format: str, gzipped: bool, batch_size: int, max_errors: int) -> dict:
+    # Loads valid rows into the caller's transaction; the caller commits.
+    if gzipped:
+        chunks = decompressed(chunks)
+    batches = line_batches(chunks)
+    records = csv_records(batches) if format == "csv" else ndjson_records(batches)
+
+    imported = 0
+    rejected = 0
+    errors = []
+    batch = []
+    # One batch is sent to the database while the next is parsed; the
+    # session is only ever used by that single in-flight load.
+    loading = None
+    try:
+        async for line_no, record in records:
+            if isinstance(record, str):
+                message = record
+            else:
+                try:
+                    batch.append(import_record(BookImportRow.model_validate(record)))
+                    message = None
+                except ValidationError as error:
+                    message = validation_message(error)
+
+            if message is not None:
+                rejected += 1
+                if len(errors) < max_errors:
+                    errors.append({"line": line_no, "error": message})
+
+            if len(batch) >= batch_size:
+                if loading is not None:
+                    await loading
+                loading = asyncio.ensure_future(load_batch(db, batch))
+                imported += len(batch)
+                batch = []
+
+        if loading is not None:
+            await loading
+    except BaseException:
+        # e.g. the client disconnected mid-upload; the caller rolls back
+        if loading is not None and not loading.done():
+            loading.cancel()
+        raise
+
+    if batch:
+        await load_batch(db, batch)
+        imported += len(batch)
+
+    return {"imported": imported, "rejected": rejected, "errors": errors, "errors_truncated": rejected > len(errors)}
@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    # Small in-process LRU with a per-entry time to live. Safe to share
+    # between the threadpool workers that run sync routes.
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl: float = None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def invalidate_items(self, predicate):
+        # predicate(key, value)
+        with self._lock:
+            for key in [k for k, entry in self._data.items() if predicate(k, entry[1])]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+
+class GenerationCache:
+    # TTLCache for values computed from the database. A reader takes token()
+    # before it queries and hands it back to set(); any invalidation in
+    # between moves the generation on and the possibly stale value is not
+    # stored, instead of outliving the write that should have removed it.
+    def __init__(self, maxsize: int, ttl: float):
+        self.generation = 0
+        self._entries = TTLCache(maxsize, ttl)
+        self._lock = threading.Lock()
+
+    def token(self) -> int:
+        return self.generation
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def set(self, token: int, key, value) -> bool:
+        with self._lock:
+            if token != self.generation:
+                return False
+            self._entries.set(key, value)
+            return True
+
+    def invalidate(self, key):
+        with self._lock:
+            self.generation += 1
+            self._entries.invalidate(key)
+
+    def invalidate_items(self, predicate):
+        with self._lock:
+            self.generation += 1
+            self._entries.invalidate_items(predicate)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"generation": self.generation, **self._entries.stats()}
+
+
+class VersionedResponseCache(GenerationCache):
+    # Pre-serialized response bodies, each remembering which rows it holds so
+    # a write to a few rows only drops the responses that show them.
+    def get(self, key):
+        # (etag, body) or None
+        entry = super().get(key)
+        return entry[:2] if entry is not None else None
+
+    def set(self, token: int, key, body: bytes, row_ids=()):
+        # Strong ETag from the bytes themselves, so it stays valid across
+        # restarts and workers.
+        entry = ('"%s"' % hashlib.sha256(body).hexdigest(), body, frozenset(row_ids))
+        super().set(token, key, entry)
+        return entry[:2]
+
+    def invalidate_rows(self, row_ids, also=None):
+        # Drop responses containing any of row_ids, plus those whose key
+        # matches also(key) (e.g. listings the change may reorder).
+        row_ids = set(row_ids)
+        self.invalidate_items(lambda key, entry: not row_ids.isdisjoint(entry[2]) or (also is not None and also(key)))
+
+
+# In-process indexes (search, autocomplete, facets) carry .ready and
+# .loaded_at. The event loop keeps only a weak reference to a task, so the
+# running background refreshes are held here until they finish.
+_refresh_tasks = {}
+
+
+async def ensure_fresh(index, loader, db, session_factory, max_age: float):
+    # First use loads inline with loader(db). After that an index older than
+    # max_age (writes on other workers) is reloaded in the background, on a
+    # session of its own, while the current copy keeps serving.
+    if not index.ready:
+        await loader(db)
+    elif time.monotonic() - index.loaded_at > max_age and index not in _refresh_tasks:
+
+        async def refresh():
+            async with session_factory() as session:
+                await loader(session)
+
+        task = asyncio.create_task(refresh())
+        _refresh_tasks[index] = task
+        task.add_done_callback(lambda _: _refresh_tasks.pop(index, None))
+    return index
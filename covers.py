@@ -0,0 +1,112 @@
+import os
+import tempfile
+import uuid
+
+from fastapi import HTTPException, UploadFile
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+
+
+# Cover image storage. Bytes arrive as an async stream and each chunk is
+# handed to the threadpool only for the write itself, so a slow client holds
+# no worker thread while we wait for its next chunk. Size and type are
+# checked as the bytes arrive; the file only appears under its final,
+# unique name once it is complete.
+#
+# That streaming cap only holds for the raw-body cover endpoint. Multipart
+# forms are spooled whole by the form parser before the handler sees them;
+# CoverFormRoute can only refuse them up front by their Content-Length, and
+# a chunked multipart upload is still spooled in full before its 413.
+
+COVER_DIR = os.getenv("COVER_DIR", "uploads")
+COVER_MAX_BYTES = int(os.getenv("COVER_MAX_BYTES", 5 * 1024 * 1024))
+COVER_CHUNK_SIZE = 64 * 1024
+# room for the other form fields next to the file in a multipart body
+COVER_FORM_ALLOWANCE = 64 * 1024
+
+COVER_TYPES = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+}
+
+
+def sniff_image(head: bytes):
+    # content type from the file's magic bytes, or None
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def check_cover_size(content_length, allowance: int = 0):
+    # early 413 when the client announces an oversized body
+    if content_length is not None and content_length.isdigit() and int(content_length) > COVER_MAX_BYTES + allowance:
+        raise HTTPException(status_code=413, detail=f"Cover image larger than {COVER_MAX_BYTES} bytes")
+
+
+class CoverFormRoute(APIRoute):
+    # For form endpoints with a cover file: FastAPI parses the form before
+    # any dependency or handler runs, so the size check goes in front of it.
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def checked_handler(request):
+            check_cover_size(request.headers.get("content-length"), allowance=COVER_FORM_ALLOWANCE)
+            return await handler(request)
+
+        return checked_handler
+
+
+async def read_upload(upload: UploadFile):
+    while chunk := await upload.read(COVER_CHUNK_SIZE):
+        yield chunk
+
+
+def _open_temp():
+    os.makedirs(COVER_DIR, exist_ok=True)
+    return tempfile.NamedTemporaryFile(dir=COVER_DIR, prefix=".upload-", delete=False)
+
+
+def _discard(temp):
+    temp.close()
+    if os.path.exists(temp.name):
+        os.unlink(temp.name)
+
+
+async def save_cover(chunks, content_type: str) -> str:
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type not in COVER_TYPES:
+        raise HTTPException(status_code=415, detail=f"Cover must be one of: {', '.join(COVER_TYPES)}")
+
+    temp = await run_in_threadpool(_open_temp)
+    try:
+        size = 0
+        head = b""
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > COVER_MAX_BYTES:
+                raise HTTPException(status_code=413, detail=f"Cover image larger than {COVER_MAX_BYTES} bytes")
+            if len(head) < 12:
+                head += chunk[:12]
+                if len(head) >= 12 and sniff_image(head) != content_type:
+                    raise HTTPException(status_code=415, detail=f"Cover content is not {content_type}")
+            await run_in_threadpool(temp.write, chunk)
+
+        if len(head) < 12 and sniff_image(head) != content_type:
+            raise HTTPException(status_code=415, detail=f"Cover content is not {content_type}")
+        await run_in_threadpool(temp.close)
+
+        # unique name, so two uploads called cover.jpg can't overwrite each other
+        path = f"{COVER_DIR}/{uuid.uuid4().hex}{COVER_TYPES[content_type]}"
+        await run_in_threadpool(os.replace, temp.name, path)
+    except BaseException:
+        await run_in_threadpool(_discard, temp)
+        raise
+    return path
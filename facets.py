@@ -0,0 +1,109 @@
+import bisect
+import threading
+import time
+
+from sqlalchemy import select, func, case
+
+from cache import ensure_fresh
+from model import BookStore
+
+
+# Lower bounds of the storefront price buckets; the last one is open ended.
+PRICE_BUCKETS = [0, 100, 200, 500, 1000, 2000]
+
+
+def price_bucket(price: int) -> str:
+    i = max(bisect.bisect_right(PRICE_BUCKETS, price) - 1, 0)
+    if i + 1 < len(PRICE_BUCKETS):
+        return f"{PRICE_BUCKETS[i]}-{PRICE_BUCKETS[i + 1] - 1}"
+    return f"{PRICE_BUCKETS[i]}+"
+
+
+def decade(year: int) -> int:
+    return (year // 10) * 10
+
+
+def category_label(category) -> str:
+    return getattr(category, "value", category)
+
+
+class FacetIndex:
+    # Book counts per (category, price bucket, decade) cell. There are only a
+    # few hundred cells, so any filter combination is a sum over them.
+    def __init__(self):
+        self.cells = {}
+        self.ready = False
+        self.loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def load(self, cells: dict, loaded_at: float):
+        with self._lock:
+            self.cells = cells
+            self.ready = True
+            self.loaded_at = loaded_at
+
+    def _bump(self, categories, price, publish_year, delta: int):
+        if not self.ready:
+            return
+        cell = (category_label(categories), price_bucket(price), decade(publish_year))
+        with self._lock:
+            count = self.cells.get(cell, 0) + delta
+            if count > 0:
+                self.cells[cell] = count
+            else:
+                self.cells.pop(cell, None)
+
+    def add(self, categories, price, publish_year):
+        self._bump(categories, price, publish_year, 1)
+
+    def remove(self, categories, price, publish_year):
+        self._bump(categories, price, publish_year, -1)
+
+    def counts(self, categories=None, price_ranges=None, decades=None) -> dict:
+        # Each facet ignores its own filter so the sidebar still shows the
+        # alternatives for the dimension the user is filtering on.
+        filters = (set(categories or ()), set(price_ranges or ()), set(decades or ()))
+        facets = ({}, {}, {})
+        total = 0
+        with self._lock:
+            cells = list(self.cells.items())
+        for cell, count in cells:
+            misses = [i for i in range(3) if filters[i] and cell[i] not in filters[i]]
+            if not misses:
+                total += count
+            for i in range(3):
+                if not misses or misses == [i]:
+                    facets[i][cell[i]] = facets[i].get(cell[i], 0) + count
+        return {
+            "total": total,
+            "categories": facets[0],
+            "price": facets[1],
+            "decades": {str(k): v for k, v in sorted(facets[2].items())},
+        }
+
+
+facet_index = FacetIndex()
+
+
+def _price_bucket_sql():
+    # same buckets as price_bucket(), evaluated in the database
+    whens = [(BookStore.price < high, price_bucket(low)) for low, high in zip(PRICE_BUCKETS, PRICE_BUCKETS[1:])]
+    return case(*whens, else_=price_bucket(PRICE_BUCKETS[-1]))
+
+
+async def load_facets(db):
+    bucket = _price_bucket_sql()
+    book_decade = (BookStore.publish_year // 10) * 10
+    rows = await db.execute(
+        select(BookStore.categories, bucket, book_decade, func.count())
+        .group_by(BookStore.categories, bucket, book_decade)
+    )
+    cells = {}
+    for categories, price_label, year, count in rows:
+        cell = (category_label(categories), price_label, int(year))
+        cells[cell] = cells.get(cell, 0) + count
+    facet_index.load(cells, time.monotonic())
+
+
+async def ensure_facets(db, session_factory, max_age: float):
+    return await ensure_fresh(facet_index, load_facets, db, session_factory, max_age)
@@ -0,0 +1,33 @@
+from functools import lru_cache
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+
+# Opt-in fast path for list endpoints. By default FastAPI validates the
+# returned rows against response_model, dumps the result to Python dicts and
+# json.dumps those. Here pydantic-core validates from attributes and writes
+# JSON bytes in one pass; returning the Response directly makes FastAPI skip
+# its own validation of the same content.
+
+@lru_cache(maxsize=None)
+def adapter(model_type) -> TypeAdapter:
+    return TypeAdapter(model_type)
+
+
+def dump_json(model_type, content) -> bytes:
+    type_adapter = adapter(model_type)
+    return type_adapter.dump_json(type_adapter.validate_python(content, from_attributes=True))
+
+
+class ModelResponse(Response):
+    # ModelResponse(List[CartOut], rows). Keep response_model on the route
+    # for the OpenAPI schema; it is not applied to this response.
+    media_type = "application/json"
+
+    def __init__(self, model_type, content, **kwargs):
+        self.model_type = model_type
+        super().__init__(content, **kwargs)
+
+    def render(self, content) -> bytes:
+        return dump_json(self.model_type, content)
@@ -0,0 +1,95 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+
+# Bcrypt is deliberately slow (~250 ms of CPU), so it gets its own bounded
+# pool instead of running on the event loop or FastAPI's default threadpool.
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", os.cpu_count() or 2))
+HASH_EXECUTOR = os.getenv("HASH_EXECUTOR", "thread")  # "thread" or "process"
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", HASH_WORKERS * 4))
+HASH_RETRY_AFTER = os.getenv("HASH_RETRY_AFTER", "1")
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+_executor = None
+_lock = threading.Lock()
+_stats = {
+    "in_flight": 0,
+    "peak_in_flight": 0,
+    "completed": 0,
+    "rejected": 0,
+    "busy_seconds": 0.0,
+}
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                if HASH_EXECUTOR == "process":
+                    _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+                else:
+                    _executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+    return _executor
+
+
+# Module level so they can be pickled into a process pool.
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify(password: str, hashed: str) -> bool:
+    return pwd_context.verify(password, hashed)
+
+
+async def _run(fn, *args):
+    with _lock:
+        if _stats["in_flight"] >= HASH_MAX_PENDING:
+            _stats["rejected"] += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many password operations in progress, try again shortly",
+                headers={"Retry-After": HASH_RETRY_AFTER},
+            )
+        _stats["in_flight"] += 1
+        _stats["peak_in_flight"] = max(_stats["peak_in_flight"], _stats["in_flight"])
+
+    started = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_executor(), fn, *args)
+    finally:
+        with _lock:
+            _stats["in_flight"] -= 1
+            _stats["completed"] += 1
+            _stats["busy_seconds"] += time.perf_counter() - started
+
+
+async def hash_password(password: str) -> str:
+    # truncate to 72 chars to avoid bcrypt error
+    return await _run(_hash, password[:72])
+
+
+def _verify_and_update(password: str, hashed: str):
+    return pwd_context.verify_and_update(password, hashed)
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    return await _run(_verify, password[:72], hashed)
+
+
+async def verify_and_update_password(password: str, hashed: str):
+    # One bcrypt verify; returns (valid, new_hash) where new_hash is set only
+    # when the stored hash uses outdated parameters and should be replaced.
+    return await _run(_verify_and_update, password[:72], hashed)
+
+
+def hashing_stats() -> dict:
+    with _lock:
+        return dict(_stats, workers=HASH_WORKERS, executor=HASH_EXECUTOR, max_pending=HASH_MAX_PENDING)
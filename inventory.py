@@ -0,0 +1,29 @@
+from fastapi import HTTPException
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from model import BookStore
+
+
+# Stock reservation for checkout. Each title is decremented with a
+# conditional UPDATE ... WHERE stock >= n, so the check and the write are one
+# statement and two buyers can never both take the last copy. The row lock
+# taken by the UPDATE is held until the caller commits or rolls back; taking
+# those locks in ascending book_id order means two carts sharing titles
+# queue behind each other instead of deadlocking.
+
+async def reserve_stock(db: AsyncSession, quantities: dict):
+    # quantities: {book_id: quantity}. Raises 409 naming the first title that
+    # cannot be covered; the caller must roll back the partial reservation.
+    for book_id in sorted(quantities):
+        quantity = quantities[book_id]
+        reserved = await db.scalar(
+            update(BookStore)
+            .where(BookStore.book_id == book_id, BookStore.stock >= quantity)
+            .values(stock=BookStore.stock - quantity)
+            .returning(BookStore.book_id)
+            .execution_options(synchronize_session=False)
+        )
+        if reserved is None:
+            raise HTTPException(status_code=409, detail=f"Insufficient stock for book {book_id}")
+
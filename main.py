@@ -1,20 +1,46 @@
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Form
-from sqlalchemy.orm import Session
-from model import BookStore
-from schemas import BookCreate, BookOut, Book
-from db import SessionLocal, base, engine
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Form, Query, Request, Header, Response
+from fastapi.responses import StreamingResponse
+from fastapi.routing import APIRouter
+from pydantic_core import to_json
+from sqlalchemy.orm import make_transient_to_detached, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import inspect as sa_inspect
+from model import BookStore, CategoryEnum
+from schemas import BookCreate, BookOut, Book, BookPage, BookSearchPage, AutocompleteSuggestion, BookFacets, BookImportReport
+from db import AsyncSessionLocal, pool_stats
+from db import read_sessionmaker, replica_engines, replica_health_loop, replica_stats, READ_YOUR_WRITES_SECONDS
+import asyncio
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
-from sqlalchemy import func
+from typing import List, Optional
+from sqlalchemy import func, tuple_, select, update, delete, case, exists
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from pagination import encode_cursor, decode_cursor
+from search import search_index, ensure_search_index, pg_search
+from search import prefix_index, ensure_prefix_index, pg_fuzzy_complete
+from facets import facet_index, ensure_facets
+from bulk_import import import_books
+from covers import save_cover, read_upload, check_cover_size, CoverFormRoute
 import os
-import shutil
+import io
+import csv
+import enum
+import zlib
+import math
+import hashlib
+import hmac
 from jose import jwt, JWTError
 
 #User
 from datetime import datetime,timedelta
 from jose import JWTError, jwt
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from passlib.context import CryptContext
+from hashing import hash_password, verify_password, verify_and_update_password, hashing_stats
+from metrics import Histogram
+from cache import TTLCache, GenerationCache, VersionedResponseCache
+from fastjson import ModelResponse, dump_json
+import time
 from model import User
 from schemas import UserCreate, UserLogin, UserOut, ForgotPasswordRequest, ResetPasswordRequest
 
@@ -24,26 +50,41 @@ from schemas import UserCreate, UserLogin, UserOut, ForgotPasswordRequest, Reset
 from functools import partial
 
 #Review
-from schemas import ReviewCreate, ReviewOut
+from schemas import ReviewCreate, ReviewOut, ReviewUpdate, ReviewPage
 from model import Review
 
 #Update Profile
 from schemas import UserUpdate, UpdatePassword
 
 #WiseList
-from schemas import FolderCreate, FolderOut, ItemCreate, ItemOut
+from schemas import FolderCreate, FolderOut, ItemCreate, ItemOut, FolderFull, WishListBook
 from model import WishListFolder, WishListItem
 
 #Cart
-from schemas import CartCreate, CartOut
+from schemas import CartCreate, CartOut, CartBatchUpdate, CartSummary
 from model import Cart
 
+#Orders
+from schemas import CheckoutCreate, OrderOut, OrderPage
+from model import Order, OrderLine, IdempotencyKey
+from inventory import reserve_stock
+
 SECRETE_KEY = 'your_secrete_key_12345'
 ALGORITHM = 'HS256'
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+PRINCIPAL_CACHE_TTL = int(os.getenv("PRINCIPAL_CACHE_TTL", 60))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))  # 0 disables
+AUTOCOMPLETE_MAX_AGE = int(os.getenv("AUTOCOMPLETE_MAX_AGE", 300))
+FACETS_MAX_AGE = int(os.getenv("FACETS_MAX_AGE", 300))
+CART_SUMMARY_TTL = int(os.getenv("CART_SUMMARY_TTL", 300))
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", 1000))
+CATALOG_CACHE_TTL = int(os.getenv("CATALOG_CACHE_TTL", 300))
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 5000))
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", 1000))
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='login')
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 app = FastAPI()
@@ -56,30 +97,88 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-base.metadata.create_all(bind = engine)
+@app.on_event("startup")
+async def start_replica_health_checks():
+    if replica_engines:
+        app.state.replica_health = asyncio.create_task(replica_health_loop())
 
-def get_db():
-    db = SessionLocal()
-    try:
+
+@app.on_event("shutdown")
+async def stop_replica_health_checks():
+    task = getattr(app.state, "replica_health", None)
+    if task is not None:
+        task.cancel()
+
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
-    
-    
-  
+
+
+# Read-your-writes across workers: a write leaves a signed cookie naming the
+# user and the time of the write, so whichever worker serves that client's
+# next read sends it to the primary until the replicas have caught up.
+WRITE_MARKER_COOKIE = "last_write"
+
+
+def sign_write_marker(value: str) -> str:
+    return hmac.new(SECRETE_KEY.encode(), value.encode(), hashlib.sha256).hexdigest()
+
+
+def mark_user_write(response: Response, user_id: int):
+    value = f"{user_id}:{time.time():.3f}"
+    response.set_cookie(
+        WRITE_MARKER_COOKIE,
+        f"{value}:{sign_write_marker(value)}",
+        max_age=math.ceil(READ_YOUR_WRITES_SECONDS),
+        httponly=True,
+        samesite="lax",
+    )
+
+
+def wrote_recently(request: Request, user_id: str) -> bool:
+    value, _, signature = request.cookies.get(WRITE_MARKER_COOKIE, "").rpartition(":")
+    if not value or not hmac.compare_digest(signature, sign_write_marker(value)):
+        return False
+    marked_user, _, written_at = value.partition(":")
+    return marked_user == user_id and time.time() - float(written_at) < READ_YOUR_WRITES_SECONDS
+
+
+# Read-only handlers: a replica session, unless the user in the path wrote
+# recently, in which case they read their own writes from the primary.
+async def get_read_db(request: Request):
+    # Runs before path validation, so the id is still the raw path string.
+    user_id = request.path_params.get("user_id")
+    session_factory = read_sessionmaker(user_id is not None and wrote_recently(request, user_id))
+    async with session_factory() as db:
+        yield db
+
+
+@app.get("/metrics", tags=["Metrics"])
+async def get_metrics():
+    return {
+        "hashing": hashing_stats(),
+        "login_seconds": LOGIN_SECONDS.snapshot(),
+        "principal_cache": principal_cache.stats(),
+        "token_cache": decoded_token_cache.stats(),
+        "db_pool": pool_stats(),
+        "db_replicas": replica_stats(),
+        "cart_summary_cache": cart_summary_cache.stats(),
+        "catalog_cache": catalog_cache.stats(),
+    }
     
     
 #Users
 
 # Signup endpoint
 @app.post("/signup", response_model=UserOut, tags=["Users"])
-def signup(user: UserCreate, db: Session = Depends(get_db)):
-    existing_user = db.query(User).filter(User.email == user.email).first()
+async def signup(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    existing_user = await db.scalar(select(User).where(User.email == user.email))
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    # Hash password directly here (truncate to 72 chars to avoid bcrypt error)
-    hashed_password = pwd_context.hash(user.password[:72])
+    # Hashed on the bcrypt pool (truncated to 72 chars to avoid bcrypt error)
+    hashed_password = await hash_password(user.password)
 
     new_user = User(
         name=user.name,
@@ -88,33 +187,54 @@ def signup(user: UserCreate, db: Session = Depends(get_db)):
         phone=user.phone
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 
+LOGIN_SECONDS = Histogram([0.05, 0.1, 0.25, 0.5, 1, 2.5, 5])
+
+
+# Shared by the user and admin login: exactly one bcrypt verify, and the
+# stored hash is upgraded in place when the CryptContext says it is outdated.
+async def authenticate_user(db: AsyncSession, email: str, password: str):
+    started = time.perf_counter()
+    try:
+        db_user = await db.scalar(select(User).where(User.email == email))
+        if not db_user:
+            return None
+
+        valid, new_hash = await verify_and_update_password(password, db_user.password)
+        if not valid:
+            return None
+
+        if new_hash:
+            db_user.password = new_hash
+            await db.commit()
+            await db.refresh(db_user)
+            invalidate_principal(db_user.user_id)
+        return db_user
+    finally:
+        LOGIN_SECONDS.observe(time.perf_counter() - started)
+
+
 # Login endpoint
 @app.post("/login", tags=["Users"])
-def login(user: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.username).first()
-
-    if not db_user or not pwd_context.verify(user.password, db_user.password):
+async def login(user: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+    db_user = await authenticate_user(db, user.username, user.password)
+    if not db_user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(data={"sub": str(db_user.user_id), "role": "user"} , expires_delta=access_token_expires)
 
-    # Verify password directly
-    if not pwd_context.verify(user.password[:72], db_user.password):
-        raise HTTPException(status_code=401, detail="Invalid Password")
-
     return {"message": f"Welcome {db_user.name}!", "access_token": access_token, "token_type": "bearer"}
 
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=15))
-    to_encode.update({'exp': expire})
+    to_encode.update({'exp': expire, 'iat': datetime.utcnow()})
     return jwt.encode(to_encode, SECRETE_KEY, algorithm=ALGORITHM)
 
 
@@ -129,35 +249,106 @@ def verify_access_token(token: str, credentials_exception):
         raise credentials_exception
     
     
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail= 'could not valid credential',
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
+# Resolved principals keyed by (user_id, token iat), so an authenticated request
+# doesn't need a users lookup. Only column values are cached; each hit is
+# re-attached to the request's session without issuing a query.
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+USER_COLUMNS = [attr.key for attr in sa_inspect(User).column_attrs]
+
+
+async def load_principal(db: AsyncSession, user_id: int, issued_at):
+    key = (user_id, issued_at)
+    values = principal_cache.get(key)
+    if values is None:
+        user = await db.scalar(select(User).where(User.user_id == user_id))
+        if user is not None:
+            principal_cache.set(key, {name: getattr(user, name) for name in USER_COLUMNS})
+        return user
+
+    user = User(**values)
+    make_transient_to_detached(user)
+    return await db.merge(user, load=False)
+
+
+def invalidate_principal(user_id: int):
+    # Call after anything that changes a user's row (profile, password, role).
+    principal_cache.invalidate_where(lambda key: key[0] == user_id)
+
+
+# Decoded payloads keyed by the raw token string, kept until the token
+# expires, so repeat callers skip signature verification and JSON parsing.
+decoded_token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+
+def decode_access_token(token: str) -> dict:
+    payload = decoded_token_cache.get(token) if TOKEN_CACHE_SIZE else None
+    if payload is None:
         payload = jwt.decode(token, SECRETE_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        role: str = payload.get("role")
+        if TOKEN_CACHE_SIZE and "exp" in payload:
+            decoded_token_cache.set(token, payload, ttl=payload["exp"] - time.time())
+    return payload
+
+
+async def get_token_payload(request: Request, token: str = Depends(oauth2_scheme)):
+    # Memoized on the request so nested dependencies decode at most once.
+    payload = getattr(request.state, "token_payload", None)
+    if payload is not None:
+        return payload
+
+    try:
+        payload = decode_access_token(token)
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has expired",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     except JWTError:
-        raise credentials_exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
 
-    if user_id is None or role != "user":
-        raise credentials_exception
+    request.state.token_payload = payload
+    return payload
 
-    user = db.query(User).filter(User.user_id == int(user_id)).first()
-    if user is None:
-        raise credentials_exception
-    return user
+
+def require_role(role: str, detail: str = "Could not validate credentials"):
+    async def dependency(payload: dict = Depends(get_token_payload), db: AsyncSession = Depends(get_db)):
+        credentials_exception = HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=detail,
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+        user_id: str = payload.get("sub")
+        if user_id is None or payload.get("role") != role:
+            raise credentials_exception
+
+        user = await load_principal(db, int(user_id), payload.get("iat"))
+        if user is None:
+            raise credentials_exception
+        # admin tokens must still belong to an admin row
+        if role == "admin" and user.role != "admin":
+            raise credentials_exception
+        return user
+
+    return dependency
+
+
+get_current_user = require_role("user")
+get_user_access = get_current_user
+get_current_admin = require_role("admin")
+get_admin_user = require_role("admin", detail="Not authorized to perform this action")
 
 @app.get('/profile', tags=["Users"])
-def read_profile(current_user: User = Depends(get_current_user)):
+async def read_profile(current_user: User = Depends(get_current_user)):
     return {"id": current_user.user_id, "name" : current_user.name, "email": current_user.email}
 
 
 @app.post('/user/forgot-password', tags=['user'])
-def forgot_password(request : ForgotPasswordRequest, db : Session = Depends(get_db)):
-    user = db.query(User).filter(func.lower(User.email) == request.email.lower()).first()
+async def forgot_password(request : ForgotPasswordRequest, db : AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(User).where(func.lower(User.email) == request.email.lower()))
     if not user:
         raise HTTPException(status_code=404, detail= "User not found...")
     reset_token = create_access_token (
@@ -168,7 +359,7 @@ def forgot_password(request : ForgotPasswordRequest, db : Session = Depends(get_
 
 
 @app.post('/user/reset-password', tags=['user'])
-def reset_password(request : ResetPasswordRequest, db : Session = Depends(get_db)):
+async def reset_password(request : ResetPasswordRequest, db : AsyncSession = Depends(get_db)):
     try:
         payload = jwt.decode(request.token, SECRETE_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
@@ -179,7 +370,7 @@ def reset_password(request : ResetPasswordRequest, db : Session = Depends(get_db
     if role != "user":
         raise HTTPException(status_code=401, detail="Invalid token role")
 
-    user = db.query(User).filter(User.user_id == int(user_id)).first()
+    user = await db.scalar(select(User).where(User.user_id == int(user_id)))
     if not user:
         raise HTTPException(status_code=404, detail="user not found...")
     
@@ -187,11 +378,12 @@ def reset_password(request : ResetPasswordRequest, db : Session = Depends(get_db
         raise HTTPException(status_code=400, detail="Passwords do not match")
 
     # Hash new password and update
-    hashed_password = pwd_context.hash(request.new_password[:72])
+    hashed_password = await hash_password(request.new_password)
     user.password = hashed_password
 
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
+    invalidate_principal(user.user_id)
 
     return {"message": "Password reset successfully"}
 
@@ -203,13 +395,13 @@ def reset_password(request : ResetPasswordRequest, db : Session = Depends(get_db
 
 # Signup endpoint
 @app.post("/admin/signup", response_model=UserOut, tags=["Admins"])
-def signup(admin: UserCreate, db: Session = Depends(get_db)):
-    existing_admin = db.query(User).filter(User.email == admin.email).first()
+async def signup(admin: UserCreate, db: AsyncSession = Depends(get_db)):
+    existing_admin = await db.scalar(select(User).where(User.email == admin.email))
     if existing_admin:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    # Hash password directly here (truncate to 72 chars to avoid bcrypt error)
-    hashed_password = pwd_context.hash(admin.password[:72])
+    # Hashed on the bcrypt pool (truncated to 72 chars to avoid bcrypt error)
+    hashed_password = await hash_password(admin.password)
 
     new_admin = User(
         name=admin.name,
@@ -219,62 +411,26 @@ def signup(admin: UserCreate, db: Session = Depends(get_db)):
         role='admin'
     )
     db.add(new_admin)
-    db.commit()
-    db.refresh(new_admin)
+    await db.commit()
+    await db.refresh(new_admin)
     return new_admin
 
 
 # Login endpoint
 @app.post("/admin/login", tags=["Admins"])
-def login(admin: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    db_admin = db.query(User).filter(User.email == admin.username).first()
-
-    if not db_admin or not pwd_context.verify(admin.password, db_admin.password):
+async def login(admin: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+    db_admin = await authenticate_user(db, admin.username, admin.password)
+    if not db_admin:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(data={"sub": str(db_admin.user_id), "role": db_admin.role} , expires_delta=access_token_expires)
-    
-    # Verify password directly
-    if not pwd_context.verify(admin.password[:72], db_admin.password):
-        raise HTTPException(status_code=401, detail="Invalid Password")
 
     return {"message": f"Welcome {db_admin.name}!", "access_token": access_token, "token_type": "bearer"}
 
 
-def get_current_admin(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-
-    try:
-        payload = jwt.decode(token, SECRETE_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        role: str = payload.get("role")
-
-        if user_id is None or role != "admin":
-            raise credentials_exception
-
-        admin = db.query(User).filter(User.user_id == int(user_id), User.role == "admin").first()
-        if admin is None:
-            raise credentials_exception
-
-        return admin
-
-    except JWTError:  # Correct exception for python-jose
-        raise credentials_exception
-    except jwt.ExpiredSignatureError:  # Optional: more descriptive
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token has expired",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
-
 @app.get('/admin/profile', tags=["Admins"])
-def read_profile(current_admin: User = Depends(get_current_admin)):
+async def read_profile(current_admin: User = Depends(get_current_admin)):
     return {
         "id": current_admin.user_id,
         "name": current_admin.name,
@@ -284,8 +440,8 @@ def read_profile(current_admin: User = Depends(get_current_admin)):
     
 
 @app.get('/admin/view-user', tags=["Admins"])
-def get_all_users(current_admin: User = Depends(get_current_admin), db: Session = Depends(get_db)):
-    users = db.query(User).filter(User.role == "User").all()
+async def get_all_users(current_admin: User = Depends(get_current_admin), db: AsyncSession = Depends(get_db)):
+    users = (await db.scalars(select(User).where(User.role == "User"))).all()
     return users
     
 
@@ -294,33 +450,13 @@ def get_all_users(current_admin: User = Depends(get_current_admin), db: Session
 
 #Authorization
 
+# Book forms carrying a cover file: oversized uploads get their 413 before
+# the form is parsed (see CoverFormRoute).
+cover_form_router = APIRouter(route_class=CoverFormRoute)
 
-def get_admin_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Not authorized to perform this action",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-
-    try:
-        payload = jwt.decode(token, SECRETE_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        role: str = payload.get("role")
-    except JWTError:
-        raise credentials_exception
-
-    if user_id is None or role != "admin":
-        raise credentials_exception
-
-    admin = db.query(User).filter(User.user_id == int(user_id), User.role == "admin").first()
-    if admin is None:
-        raise credentials_exception
 
-    return admin
-
-
-@app.post("/books/admin/create", tags=["Authorization"])
-def create_book(
+@cover_form_router.post("/books/admin/create", tags=["Authorization"])
+async def create_book(
     title: str = Form(...),
     author_name: str = Form(...),
     rating: float = Form(...),
@@ -330,16 +466,13 @@ def create_book(
     publish_year: int = Form(...),
     description: str = Form(...),
     cover_photo: UploadFile = File(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_admin: User = Depends(get_admin_user)  # <--- wrapper ensures admin role
 ):
     
     image_path = None
     if cover_photo:
-        os.makedirs("uploads", exist_ok=True)
-        image_path = f"uploads/{cover_photo.filename}"
-        with open(image_path, "wb") as buffer:
-            shutil.copyfileobj(cover_photo.file, buffer)
+        image_path = await save_cover(read_upload(cover_photo), cover_photo.content_type)
         
     new_book = BookStore(
         title=title,
@@ -353,13 +486,17 @@ def create_book(
         cover_photo=image_path
     )
     db.add(new_book)
-    db.commit()
-    db.refresh(new_book)
+    await db.commit()
+    await db.refresh(new_book)
+    search_index.upsert(new_book.book_id, title=new_book.title, author_name=new_book.author_name, description=new_book.description)
+    prefix_index.upsert(new_book.book_id, new_book.title, new_book.author_name)
+    facet_index.add(new_book.categories, new_book.price, new_book.publish_year)
+    catalog_cache.clear()
     return new_book
 
 
-@app.put("/books/admin/update/{book_id}", tags=["Authorization"])
-def update_book(
+@cover_form_router.put("/books/admin/update/{book_id}", tags=["Authorization"])
+async def update_book(
     book_id: int,
     title: str = Form(...),
     auth_fname: str = Form(...),
@@ -371,12 +508,13 @@ def update_book(
     year: int = Form(...),
     detail: str = Form(...),
     image: UploadFile = File(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_admin: User = Depends(get_admin_user)
 ):
-    db_book = db.query(BookStore).filter(BookStore.book_id == book_id).first()
+    db_book = await db.scalar(select(BookStore).where(BookStore.book_id == book_id))
     if not db_book:
         raise HTTPException(status_code=404, detail="Book not found.")
+    previous_facets = (db_book.categories, db_book.price, db_book.publish_year)
 
     # Update all fields
     db_book.title = title
@@ -391,68 +529,368 @@ def update_book(
 
     # Handle optional image upload
     if image:
-        os.makedirs("uploads", exist_ok=True)
-        image_path = f"uploads/{image.filename}"
-        with open(image_path, "wb") as buffer:
-            shutil.copyfileobj(image.file, buffer)
-        db_book.image = image_path
-
-    db.commit()
-    db.refresh(db_book)
+        db_book.cover_photo = await save_cover(read_upload(image), image.content_type)
+
+    await db.commit()
+    await db.refresh(db_book)
+    search_index.upsert(db_book.book_id, title=db_book.title, author_name=db_book.author_name, description=db_book.description)
+    prefix_index.upsert(db_book.book_id, db_book.title, db_book.author_name)
+    facet_index.remove(*previous_facets)
+    facet_index.add(db_book.categories, db_book.price, db_book.publish_year)
+    cart_summary_cache.clear()
+    catalog_cache.clear()
     return db_book
 
 
+app.include_router(cover_form_router)
+
+
+# Raw image body (Content-Type: image/...), streamed straight to disk without
+# the multipart parser spooling it first; the only upload whose size cap
+# holds however the body is sent. The previous file is left in place:
+# covers saved before unique names existed may be shared between books.
+@app.put("/books/admin/{book_id}/cover", tags=["Authorization"])
+async def upload_cover(
+    book_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_admin: User = Depends(get_admin_user),
+):
+    check_cover_size(request.headers.get("content-length"))
+    db_book = await db.get(BookStore, book_id)
+    if not db_book:
+        raise HTTPException(status_code=404, detail="Book not found.")
+
+    db_book.cover_photo = await save_cover(request.stream(), request.headers.get("content-type"))
+    await db.commit()
+    catalog_cache.clear()
+    return {"book_id": book_id, "cover_photo": db_book.cover_photo}
+
+
     
        
 @app.delete("/books/admin/delete/{book_id}", tags=["Authorization"])
-def delete_book(
+async def delete_book(
     book_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_admin: User = Depends(get_admin_user)  # wrapper ensures admin role
 ):
-    db_book = db.query(BookStore).filter(BookStore.book_id == book_id).first()
+    db_book = await db.scalar(select(BookStore).where(BookStore.book_id == book_id))
     if not db_book:
         raise HTTPException(status_code=404, detail="Book not Found...")
     
-    db.delete(db_book)
-    db.commit()
+    await db.delete(db_book)
+    await db.commit()
+    search_index.remove(book_id)
+    prefix_index.remove(book_id)
+    facet_index.remove(db_book.categories, db_book.price, db_book.publish_year)
+    cart_summary_cache.clear()
+    catalog_cache.clear()
     return {"message": f"Book with ID {book_id} deleted successfully"}
 
+
+# Bulk import from a raw CSV or NDJSON request body (Content-Encoding: gzip
+# accepted). All valid rows land in one transaction; see bulk_import.py.
+@app.post("/admin/books/import", response_model=BookImportReport, tags=["Authorization"])
+async def import_catalog(
+    request: Request,
+    format: str = Query("csv", pattern="^(ndjson|csv)$"),
+    db: AsyncSession = Depends(get_db),
+    current_admin: User = Depends(get_admin_user),
+):
+    gzipped = request.headers.get("content-encoding", "").lower() == "gzip"
+    report = await import_books(db, request.stream(), format, gzipped, IMPORT_BATCH_SIZE, IMPORT_MAX_ERRORS)
+    await db.commit()
+
+    if report["imported"]:
+        # cheaper to rebuild the in-process indexes on next use than to
+        # upsert every imported row into them
+        search_index.ready = False
+        prefix_index.ready = False
+        facet_index.ready = False
+        catalog_cache.clear()
+    return report
+
+
+# Catalog export. Rows come off a server-side cursor EXPORT_BATCH_SIZE at a
+# time and each batch is encoded and sent before the next is fetched, so
+# memory stays flat however large the table is.
+EXPORT_COLUMNS = list(BookStore.__table__.columns)
+
+
+def export_value(value):
+    return value.value if isinstance(value, enum.Enum) else value
+
+
+async def export_books(format: str):
+    names = [column.name for column in EXPORT_COLUMNS]
+    if format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(names)
+
+    # Own session (a replica when configured): the stream outlives the
+    # request handler that returned it.
+    async with read_sessionmaker()() as db:
+        result = await db.stream(
+            select(*EXPORT_COLUMNS)
+            .order_by(BookStore.book_id)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        async for rows in result.partitions():
+            if format == "csv":
+                writer.writerows([export_value(value) for value in row] for row in rows)
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+            else:
+                yield b"".join(to_json(dict(zip(names, row))) + b"\n" for row in rows)
+
+    if format == "csv" and buffer.tell():
+        # header only: the table was empty
+        yield buffer.getvalue().encode()
+
+
+async def gzip_stream(chunks):
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+@app.get("/admin/books/export", tags=["Authorization"])
+async def export_catalog(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    current_admin: User = Depends(get_admin_user),
+):
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="books.{format}"', "Vary": "Accept-Encoding"}
+    body = export_books(format)
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        body = gzip_stream(body)
+    return StreamingResponse(body, media_type=media_type, headers=headers)
+
       
       
-def get_user_access(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
+# Catalog pages are cached as serialized bytes per query string. Admin book
+# writes clear the cache; checkouts and reviews only touch stock and the
+# review aggregate, so they drop just the pages showing those books. Writes
+# on other workers are not seen here: like the autocomplete and facet
+# indexes, a page may be up to CATALOG_CACHE_TTL old.
+catalog_cache = VersionedResponseCache(maxsize=CATALOG_CACHE_SIZE, ttl=CATALOG_CACHE_TTL)
+
+
+def catalog_ratings_changed(book_id: int):
+    # a new average can also move the book within sort=average_rating listings
+    catalog_cache.invalidate_rows([book_id], also=lambda key: ("sort", "average_rating") in key)
+
+
+def cached_response(request: Request, etag: str, body: bytes):
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    client_tags = [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]
+    client_tags = [tag[2:] if tag.startswith("W/") else tag for tag in client_tags]
+    if etag in client_tags or "*" in client_tags:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+# Only the columns BookOut needs, so pages come back as plain rows and never
+# land in the session identity map.
+BOOK_OUT_COLUMNS = [getattr(BookStore, name) for name in BookOut.model_fields]
+
+BOOK_SORT_KEYS = {
+    "book_id": BookStore.book_id,
+    "price": BookStore.price,
+    "rating": BookStore.rating,
+    "publish_year": BookStore.publish_year,
+    "average_rating": BookStore.average_rating,
+}
+
+
+@app.get("/user/books", response_model=BookPage, tags=["Authorization"])  # user can view
+async def get_books(
+    request: Request,
+    categories: Optional[List[CategoryEnum]] = Query(None),
+    author_name: Optional[str] = None,
+    min_price: Optional[int] = None,
+    max_price: Optional[int] = None,
+    min_year: Optional[int] = None,
+    max_year: Optional[int] = None,
+    min_rating: Optional[float] = None,
+    sort: str = Query("book_id", pattern="^(book_id|price|rating|publish_year|average_rating)$"),
+    desc: bool = False,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_user_access),
+    db: AsyncSession = Depends(get_read_db),
+):
+    cache_key = tuple(sorted(request.query_params.multi_items()))
+    cached = catalog_cache.get(cache_key)
+    if cached is not None:
+        return cached_response(request, *cached)
+    token = catalog_cache.token()
+
+    sort_column = BOOK_SORT_KEYS[sort]
+    query = select(*BOOK_OUT_COLUMNS)
+
+    if categories:
+        query = query.where(BookStore.categories.in_(categories))
+    if author_name is not None:
+        query = query.where(BookStore.author_name == author_name)
+    if min_price is not None:
+        query = query.where(BookStore.price >= min_price)
+    if max_price is not None:
+        query = query.where(BookStore.price <= max_price)
+    if min_year is not None:
+        query = query.where(BookStore.publish_year >= min_year)
+    if max_year is not None:
+        query = query.where(BookStore.publish_year <= max_year)
+    if min_rating is not None:
+        query = query.where(BookStore.rating >= min_rating)
+
+    # Seek past the last row of the previous page instead of using OFFSET,
+    # so page N costs the same as page 1.
+    if cursor:
+        last = decode_cursor(cursor, (sort_column.type.python_type, int))
+        key = tuple_(sort_column, BookStore.book_id)
+        query = query.where(key < tuple_(*last) if desc else key > tuple_(*last))
+
+    if desc:
+        query = query.order_by(sort_column.desc(), BookStore.book_id.desc())
+    else:
+        query = query.order_by(sort_column, BookStore.book_id)
+
+    rows = (await db.execute(query.limit(limit + 1))).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        tail = rows[-1]
+        next_cursor = encode_cursor([getattr(tail, sort), tail.book_id])
+
+    body = dump_json(BookPage, {"items": rows, "next_cursor": next_cursor})
+    return cached_response(request, *catalog_cache.set(token, cache_key, body, row_ids=[row.book_id for row in rows]))
+
+
+@app.get("/books/search", response_model=BookSearchPage, tags=["Authorization"])
+async def search_books(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_user_access),
+    db: AsyncSession = Depends(get_read_db),
+):
+    after = None
+    if cursor:
+        after = decode_cursor(cursor, (float, int))
+
+    columns = list(BookOut.model_fields)
+    if db.bind.dialect.name == "postgresql":
+        # tsvector column + GIN index, ranked and highlighted in the database
+        items = await pg_search(db, q, columns, limit + 1, after)
+    else:
+        index = await ensure_search_index(db)
+        hits = index.search(q, limit + 1, after)
+        rows = (await db.execute(
+            select(*BOOK_OUT_COLUMNS).where(BookStore.book_id.in_([book_id for _, book_id in hits]))
+        )).all()
+        by_id = {row.book_id: row for row in rows}
+        items = [
+            dict(by_id[book_id]._mapping, rank=rank, snippet=index.snippet(book_id, q))
+            for rank, book_id in hits if book_id in by_id
+        ]
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor([items[-1]["rank"], items[-1]["book_id"]])
+
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@app.get("/books/facets", response_model=BookFacets, tags=["Authorization"])
+async def get_book_facets(
+    categories: Optional[List[CategoryEnum]] = Query(None),
+    price: Optional[List[str]] = Query(None),
+    decades: Optional[List[int]] = Query(None),
+    current_user: User = Depends(get_user_access),
+    db: AsyncSession = Depends(get_read_db),
+):
+    index = await ensure_facets(db, read_sessionmaker, FACETS_MAX_AGE)
+    return index.counts(
+        categories=[c.value for c in categories or []],
+        price_ranges=price,
+        decades=decades,
     )
-    payload = jwt.decode(token, SECRETE_KEY, algorithms=[ALGORITHM])
-    user_id: str = payload.get("sub")
-    role: str = payload.get("role")
-    
-    if user_id is None or role != "user":
-        raise credentials_exception
 
-    user = db.query(User).filter(User.user_id == int(user_id)).first()
-    if user is None:
-        raise credentials_exception
-    return user
 
+@app.get("/books/autocomplete", response_model=List[AutocompleteSuggestion], tags=["Authorization"])
+async def autocomplete_books(
+    q: str = Query(..., min_length=1, max_length=100),
+    k: int = Query(10, ge=1, le=25),
+    current_user: User = Depends(get_user_access),
+    db: AsyncSession = Depends(get_read_db),
+):
+    index = await ensure_prefix_index(db, read_sessionmaker, AUTOCOMPLETE_MAX_AGE)
+    suggestions = index.complete(q, k)
 
-@app.get("/user/books", response_model=List[BookOut], tags=["Authorization"])  # user can view
-def get_books(current_user: User = Depends(get_user_access), db: Session = Depends(get_db)):
-    books = db.query(BookStore).all()
-    return books
+    # Nothing starts with what was typed: probably a typo, try similarity.
+    if not suggestions and len(q) >= 3:
+        if db.bind.dialect.name == "postgresql":
+            suggestions = await pg_fuzzy_complete(db, q, k)
+        else:
+            suggestions = index.fuzzy(q, k)
+    return suggestions
 
 
 
 # Review
 
+def star_bucket(rating: float) -> int:
+    # half-up, like the SQL backfill in the migrations
+    return min(5, max(1, int(math.floor(rating + 0.5))))
+
+
+# Single UPDATE that folds a review write into the book's aggregate; run it in
+# the same transaction as the review insert/update/delete.
+def review_aggregate_update(book_id: int, added: float = None, removed: float = None):
+    count_delta = (added is not None) - (removed is not None)
+    sum_delta = (added or 0.0) - (removed or 0.0)
+    new_count = BookStore.review_count + count_delta
+    new_sum = BookStore.rating_sum + sum_delta
+    values = {
+        "review_count": new_count,
+        "rating_sum": new_sum,
+        "average_rating": case((new_count > 0, new_sum / new_count), else_=0.0),
+    }
+
+    stars = {}
+    if added is not None:
+        stars[star_bucket(added)] = stars.get(star_bucket(added), 0) + 1
+    if removed is not None:
+        stars[star_bucket(removed)] = stars.get(star_bucket(removed), 0) - 1
+    for star, delta in stars.items():
+        if delta:
+            column = getattr(BookStore, f"rating_{star}")
+            values[column.key] = column + delta
+
+    return (
+        update(BookStore)
+        .where(BookStore.book_id == book_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+
+
 @app.post("/review/", response_model=ReviewOut, tags=["Review"])
-def create_review(review: ReviewCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    # Check if book exists
-    db_book = db.query(BookStore).filter(BookStore.book_id == review.book_id).first()
-    if not db_book:
+async def create_review(review: ReviewCreate, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+    # The aggregate UPDATE doubles as the existence check
+    result = await db.execute(review_aggregate_update(review.book_id, added=review.rating))
+    if result.rowcount == 0:
         raise HTTPException(status_code=404, detail="Book not found")
 
     new_review = Review(
@@ -462,17 +900,94 @@ def create_review(review: ReviewCreate, db: Session = Depends(get_db), current_u
         detail=review.detail
     )
     db.add(new_review)
-    db.commit()
-    db.refresh(new_review)
+    await db.commit()
+    await db.refresh(new_review)
+    catalog_ratings_changed(new_review.book_id)
     return new_review
 
 
-@app.get("/books/{book_id}/reviews", response_model=List[ReviewOut], tags=["Review"])
-def get_book_reviews(book_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    db_book = db.query(BookStore).filter(BookStore.book_id == book_id).first()
-    if not db_book:
+REVIEW_COLUMNS = [getattr(Review, name) for name in ReviewOut.model_fields]
+
+
+@app.get("/books/{book_id}/reviews", response_model=ReviewPage, tags=["Review"])
+async def get_book_reviews(
+    book_id: int,
+    sort: str = Query("newest", pattern="^(newest|highest|lowest)$"),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_user),
+):
+    if not await db.scalar(select(exists().where(BookStore.book_id == book_id))):
         raise HTTPException(status_code=404, detail="Book not found")
-    return db.query(Review).filter(Review.book_id == book_id).all()
+
+    # Every sort walks one of the (book_id, ...) indexes from a cursor.
+    query = select(*REVIEW_COLUMNS).where(Review.book_id == book_id)
+    last = None
+    if cursor:
+        last = decode_cursor(cursor, (int,) if sort == "newest" else (float, int))
+
+    if sort == "newest":
+        if last:
+            query = query.where(Review.review_id < last[0])
+        query = query.order_by(Review.review_id.desc())
+    elif sort == "highest":
+        if last:
+            query = query.where(tuple_(Review.rating, Review.review_id) < tuple_(*last))
+        query = query.order_by(Review.rating.desc(), Review.review_id.desc())
+    else:
+        if last:
+            query = query.where(tuple_(Review.rating, Review.review_id) > tuple_(*last))
+        query = query.order_by(Review.rating, Review.review_id)
+
+    rows = (await db.execute(query.limit(limit + 1))).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        tail = rows[-1]
+        next_cursor = encode_cursor([tail.review_id] if sort == "newest" else [tail.rating, tail.review_id])
+
+    return ModelResponse(ReviewPage, {"items": rows, "next_cursor": next_cursor})
+
+
+@app.put("/review/{review_id}", response_model=ReviewOut, tags=["Review"])
+async def update_review(review_id: int, payload: ReviewUpdate, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+    # Row lock until commit: concurrent edits of one review must each see the
+    # rating the previous one left, or the aggregate drifts.
+    db_review = await db.scalar(select(Review).where(Review.review_id == review_id).with_for_update())
+    if not db_review:
+        raise HTTPException(status_code=404, detail="Review not found")
+    if db_review.user_id != current_user.user_id:
+        raise HTTPException(status_code=403, detail="Not authorized to update this review")
+
+    rating_changed = payload.rating is not None and payload.rating != db_review.rating
+    if rating_changed:
+        await db.execute(review_aggregate_update(db_review.book_id, added=payload.rating, removed=db_review.rating))
+        db_review.rating = payload.rating
+    if payload.detail is not None:
+        db_review.detail = payload.detail
+
+    await db.commit()
+    await db.refresh(db_review)
+    if rating_changed:
+        catalog_ratings_changed(db_review.book_id)
+    return db_review
+
+
+@app.delete("/review/{review_id}", tags=["Review"])
+async def delete_review(review_id: int, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+    db_review = await db.scalar(select(Review).where(Review.review_id == review_id).with_for_update())
+    if not db_review:
+        raise HTTPException(status_code=404, detail="Review not found")
+    if db_review.user_id != current_user.user_id:
+        raise HTTPException(status_code=403, detail="Not authorized to delete this review")
+
+    await db.execute(review_aggregate_update(db_review.book_id, removed=db_review.rating))
+    await db.delete(db_review)
+    await db.commit()
+    catalog_ratings_changed(db_review.book_id)
+    return {"message": f"Review with ID {review_id} deleted successfully"}
 
 
 
@@ -480,13 +995,13 @@ def get_book_reviews(book_id: int, db: Session = Depends(get_db), current_user:
 # Update Profile
 
 @app.put("/user/update/{user_id}", tags=["User"])
-def update_user(
+async def update_user(
     user_id : int,
     user: UserUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user) 
 ):
-    db_user = db.query(User).filter(User.user_id == user_id).first()
+    db_user = await db.scalar(select(User).where(User.user_id == user_id))
     if not db_user:
         raise HTTPException(status_code=404, detail="User not Found...")
     if current_user.user_id != user_id:
@@ -496,7 +1011,7 @@ def update_user(
     update_data = user.dict(exclude_unset=True)
     
     if "email" in update_data:
-        existing_user = db.query(User).filter(User.email == update_data["email"]).first()
+        existing_user = await db.scalar(select(User).where(User.email == update_data["email"]))
         if existing_user and existing_user.user_id != user_id:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -507,28 +1022,30 @@ def update_user(
         if value is not None:
             setattr(db_user, key, value)
     
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    invalidate_principal(user_id)
     return db_user
 
 @app.put("/user/change-password", tags=["User"])
-def change_password(
+async def change_password(
     passwords: UpdatePassword,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
 
-    if not pwd_context.verify(passwords.last_password, current_user.password):
+    if not await verify_password(passwords.last_password, current_user.password):
         raise HTTPException(status_code=400, detail="Incorrect current password")
 
     if passwords.new_password != passwords.confirm_password:
         raise HTTPException(status_code=400, detail="New password and confirm password do not match")
 
-    hashed_new_password = pwd_context.hash(passwords.new_password[:72])
+    hashed_new_password = await hash_password(passwords.new_password)
     current_user.password = hashed_new_password
 
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(current_user)
+    invalidate_principal(current_user.user_id)
 
     return {"message": "Password updated successfully"}
 
@@ -593,22 +1110,22 @@ def change_password(
 #     db.commit()
 #     return {"message": f"WiseList with ID {wiselist_id} deleted successfully"}
 
-def ensure_default_folder(db: Session, user: User):
-    default = db.query(WishListFolder).filter_by(user_id=user.user_id, is_default=True).first()
+async def ensure_default_folder(db: AsyncSession, user: User):
+    default = await db.scalar(select(WishListFolder).filter_by(user_id=user.user_id, is_default=True))
     if default:
         return default
     
-    folder = db.query(WishListFolder).filter_by(user_id=user.user_id).first()
+    folder = await db.scalar(select(WishListFolder).filter_by(user_id=user.user_id))
     if not folder:
         folder = WishListFolder(user_id= user.user_id, name='Default', is_default=True)
         db.add(folder)
-        db.commit()
-        db.refresh(folder)
+        await db.commit()
+        await db.refresh(folder)
         return folder
     else:
         folder.is_default = True
-        db.commit()
-        db.refresh(folder)
+        await db.commit()
+        await db.refresh(folder)
         return folder
     
 # @app.post("/users/{user_id}/folders", response_model=FolderOut, status_code=status.HTTP_201_CREATED)
@@ -624,28 +1141,49 @@ def ensure_default_folder(db: Session, user: User):
 #     return folder
 
 @app.post("/users/{user_id}/folders", response_model=FolderOut)
-def create_folder(user_id: int, payload: FolderCreate, db: Session = Depends(get_db),current_admin: User = Depends(get_current_user) ):
+async def create_folder(user_id: int, payload: FolderCreate, response: Response, db: AsyncSession = Depends(get_db),current_admin: User = Depends(get_current_user) ):
     folder = WishListFolder(user_id=user_id, name=payload.name, is_default=False)
     db.add(folder)
-    db.commit()
-    db.refresh(folder)
+    await db.commit()
+    await db.refresh(folder)
+    mark_user_write(response, user_id)
     return folder
 
 
 @app.get("/user/{user_id}/folders", response_model=List[FolderOut])
-def list_folder(user_id: int , db: Session = Depends(get_db), current_admin: User = Depends(get_current_user)):
-    user = db.query(User).get(user_id)
+async def list_folder(user_id: int , db: AsyncSession = Depends(get_read_db), current_admin: User = Depends(get_current_user)):
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    folders = db.query(WishListFolder).filter_by(user_id=user_id).order_by(WishListFolder.create_at).all()
-    return folders
+    folders = (await db.scalars(select(WishListFolder).filter_by(user_id=user_id).order_by(WishListFolder.create_at))).all()
+    return ModelResponse(List[FolderOut], folders)
+
+
+# Folders, their items and each item's book in three queries however large
+# the wishlist: one per level, the lower two via selectinload's IN (...).
+@app.get("/user/{user_id}/wishlist/full", response_model=List[FolderFull])
+async def get_full_wishlist(user_id: int, db: AsyncSession = Depends(get_read_db), current_user: User = Depends(get_current_user)):
+    folders = (await db.scalars(
+        select(WishListFolder)
+        .filter_by(user_id=user_id)
+        .order_by(WishListFolder.create_at)
+        .options(
+            selectinload(WishListFolder.items)
+            .selectinload(WishListItem.book)
+            .load_only(*[getattr(BookStore, name) for name in WishListBook.model_fields])
+        )
+    )).all()
+    # only an empty result needs the extra existence check
+    if not folders and not await db.get(User, user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    return ModelResponse(List[FolderFull], folders)
 
 
 @app.post("/users/{user_id}/wishlist", response_model=ItemOut, status_code=(status.HTTP_201_CREATED))
-def add_wishlist_item(user_id : int, payload: ItemCreate, db: Session = Depends(get_db),current_admin: User = Depends(get_current_user) ):
-    user = db.query(User).get(user_id)
-    folder = db.query(WishListFolder).get(payload.folder_id)
-    book = db.query(BookStore).get(payload.book_id)
+async def add_wishlist_item(user_id : int, payload: ItemCreate, response: Response, db: AsyncSession = Depends(get_db),current_admin: User = Depends(get_current_user) ):
+    user = await db.get(User, user_id)
+    folder = await db.get(WishListFolder, payload.folder_id)
+    book = await db.get(BookStore, payload.book_id)
     
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -656,31 +1194,34 @@ def add_wishlist_item(user_id : int, payload: ItemCreate, db: Session = Depends(
     
     item = WishListItem(user_id = user_id, folder_id = payload.folder_id, book_id = payload.book_id)
     db.add(item)
-    db.commit()
-    db.refresh(item)
+    await db.commit()
+    await db.refresh(item)
+    mark_user_write(response, user_id)
     return item
 
 @app.get("/user/{user_id}/wishlist", response_model=List[ItemOut])
-def get_wishlist_items(user_id : int, db: Session = Depends(get_db),current_admin: User = Depends(get_current_user) ):
-    user = db.query(User).get(user_id)
+async def get_wishlist_items(user_id : int, db: AsyncSession = Depends(get_read_db),current_admin: User = Depends(get_current_user) ):
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    item= db.query(WishListItem).filter_by(user_id=user_id).all()
+    item= (await db.scalars(select(WishListItem).filter_by(user_id=user_id))).all()
     return item
 
 
 @app.delete("/user/wiselist/delete/{wiselist_id}")
-def delete_wiselist(
+async def delete_wiselist(
     wiselist_id: int,
-    db: Session = Depends(get_db),
+    response: Response,
+    db: AsyncSession = Depends(get_db),
     current_admin: User = Depends(get_current_user)  # wrapper ensures admin role
 ):
-    db_wiselist = db.query(WishListItem).filter(WishListItem.id == wiselist_id).first()
+    db_wiselist = await db.scalar(select(WishListItem).where(WishListItem.id == wiselist_id))
     if not db_wiselist:
         raise HTTPException(status_code=404, detail="WiseList not Found...")
     
-    db.delete(db_wiselist)
-    db.commit()
+    await db.delete(db_wiselist)
+    await db.commit()
+    mark_user_write(response, db_wiselist.user_id)
     return {"message": f"WiseList with ID {wiselist_id} deleted successfully"}
 
 
@@ -711,67 +1252,280 @@ def delete_wiselist(
 #     db.refresh(new_cart)
 #     return new_cart
 
-@app.post("/users/{user_id}/cart", response_model=CartOut, status_code=status.HTTP_201_CREATED,  tags=["Cart"])
-def add_to_cart(user_id: int, payload: CartCreate, db: Session = Depends(get_db)):
-    user = db.query(User).get(user_id)
-    book = db.query(BookStore).get(payload.book_id)
-    
-    if not user:
+CART_COLUMNS = [getattr(Cart, name) for name in CartOut.model_fields]
+
+# Per-user cart summaries, dropped on every cart mutation (and wholesale when
+# an admin changes a book, since prices and stock are part of the summary).
+cart_summary_cache = GenerationCache(maxsize=10000, ttl=CART_SUMMARY_TTL)
+
+
+def cart_changed(response: Response, user_id: int):
+    mark_user_write(response, user_id)
+    cart_summary_cache.invalidate(user_id)
+
+
+# INSERT ... ON CONFLICT (user_id, book_id) on the cart's unique key. With
+# increment=True an existing row's quantity grows by the new quantity,
+# otherwise it is replaced. Postgres and SQLite share the same syntax.
+def cart_upsert(dialect_name: str, rows: list, increment: bool = True):
+    insert = pg_insert if dialect_name == "postgresql" else sqlite_insert
+    stmt = insert(Cart).values(rows)
+    quantity = Cart.quantity + stmt.excluded.quantity if increment else stmt.excluded.quantity
+    return stmt.on_conflict_do_update(
+        index_elements=[Cart.user_id, Cart.book_id],
+        set_={"quantity": quantity},
+    ).returning(*CART_COLUMNS)
+
+
+async def raise_missing_cart_reference(db: AsyncSession, user_id: int, book_ids: list, error: Exception = None):
+    # Postgres names the violated foreign key; SQLite (no FK enforcement by
+    # default) gets an explicit existence check instead.
+    if error is not None:
+        message = str(getattr(error, "orig", error))
+        if "cart_user_id_fkey" in message:
+            raise HTTPException(status_code=404, detail="User not found")
+        if "cart_book_id_fkey" in message:
+            raise HTTPException(status_code=404, detail="Book not found")
+        raise error
+
+    if not await db.scalar(select(exists().where(User.user_id == user_id))):
         raise HTTPException(status_code=404, detail="User not found")
-    if not book:
+    found = (await db.scalars(select(BookStore.book_id).where(BookStore.book_id.in_(book_ids)))).all()
+    if len(set(found)) != len(set(book_ids)):
         raise HTTPException(status_code=404, detail="Book not found")
-    
-    existing_cart_item = db.query(Cart).filter_by(user_id=user_id, book_id=payload.book_id).first()
-    
-    if existing_cart_item:
-        existing_cart_item.quantity += payload.quantity
-        db.commit()
-        db.refresh(existing_cart_item)
-        return existing_cart_item
-    
 
-    new_cart_item = Cart(
-        user_id=user_id,
-        book_id=payload.book_id,
-        quantity=payload.quantity or 1
-    )
-    db.add(new_cart_item)
-    db.commit()
-    db.refresh(new_cart_item)
-    return new_cart_item
+
+@app.post("/users/{user_id}/cart", response_model=CartOut, status_code=status.HTTP_201_CREATED,  tags=["Cart"])
+async def add_to_cart(user_id: int, payload: CartCreate, response: Response, db: AsyncSession = Depends(get_db)):
+    dialect_name = db.bind.dialect.name
+    if dialect_name != "postgresql":
+        await raise_missing_cart_reference(db, user_id, [payload.book_id])
+
+    row = {"user_id": user_id, "book_id": payload.book_id, "quantity": payload.quantity or 1}
+    try:
+        cart_item = (await db.execute(cart_upsert(dialect_name, [row]))).one()
+        await db.commit()
+    except IntegrityError as error:
+        await db.rollback()
+        await raise_missing_cart_reference(db, user_id, [payload.book_id], error)
+
+    cart_changed(response, user_id)
+    return cart_item
 
 
 
+@app.patch("/users/{user_id}/cart", response_model=List[CartOut], tags=["Cart"])
+async def update_cart(user_id: int, payload: CartBatchUpdate, response: Response, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+    if current_user.user_id != user_id:
+        raise HTTPException(status_code=403, detail="Not authorized to update this cart")
+
+    # last entry wins when a book is listed twice
+    quantities = {item.book_id: item.quantity for item in payload.items}
+    if quantities:
+        found = set((await db.scalars(select(BookStore.book_id).where(BookStore.book_id.in_(list(quantities))))).all())
+        missing = sorted(set(quantities) - found)
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Books not found: {missing}")
+
+        upserts = [{"user_id": user_id, "book_id": book_id, "quantity": quantity} for book_id, quantity in quantities.items() if quantity > 0]
+        removals = [book_id for book_id, quantity in quantities.items() if quantity == 0]
+        if upserts:
+            await db.execute(cart_upsert(db.bind.dialect.name, upserts, increment=False))
+        if removals:
+            await db.execute(
+                delete(Cart)
+                .where(Cart.user_id == user_id, Cart.book_id.in_(removals))
+                .execution_options(synchronize_session=False)
+            )
+
+    cart_items = (await db.execute(select(*CART_COLUMNS).where(Cart.user_id == user_id).order_by(Cart.cart_id))).all()
+    await db.commit()
+    cart_changed(response, user_id)
+    return cart_items
+
+
+@app.get("/user/{user_id}/cart/summary", response_model=CartSummary, tags=["Cart"])
+async def get_cart_summary(user_id: int, db: AsyncSession = Depends(get_read_db), current_user: User = Depends(get_current_user)):
+    if current_user.user_id != user_id:
+        raise HTTPException(status_code=403, detail="Not authorized to view this cart")
+
+    summary = cart_summary_cache.get(user_id)
+    if summary is not None:
+        return summary
+    token = cart_summary_cache.token()
+
+    # one join, no per-line lazy load of Cart.book
+    rows = (await db.execute(
+        select(Cart.cart_id, Cart.book_id, Cart.quantity, BookStore.title, BookStore.price, BookStore.stock)
+        .join(BookStore, BookStore.book_id == Cart.book_id)
+        .where(Cart.user_id == user_id)
+        .order_by(Cart.cart_id)
+    )).all()
+
+    items = [
+        {
+            "cart_id": row.cart_id,
+            "book_id": row.book_id,
+            "title": row.title,
+            "price": row.price,
+            "quantity": row.quantity,
+            "line_total": row.price * row.quantity,
+            "in_stock": row.stock >= row.quantity,
+        }
+        for row in rows
+    ]
+    summary = {
+        "user_id": user_id,
+        "items": items,
+        "total_quantity": sum(item["quantity"] for item in items),
+        "grand_total": sum(item["line_total"] for item in items),
+    }
+    cart_summary_cache.set(token, user_id, summary)
+    return summary
+
+
 @app.get("/user/{user_id}/cart", response_model=List[CartOut], tags=["Cart"])
-def get_user_cart(user_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def get_user_cart(user_id: int, db: AsyncSession = Depends(get_read_db), current_user: User = Depends(get_current_user)):
     # Make sure the user exists
-    db_user = db.query(User).filter(User.user_id == user_id).first()
+    db_user = await db.scalar(select(User).where(User.user_id == user_id))
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
 
     # Fetch all Cart items for this user
-    cart_items = db.query(Cart).filter(Cart.user_id == user_id).all()
+    cart_items = (await db.scalars(select(Cart).where(Cart.user_id == user_id))).all()
 
     if not cart_items:
         raise HTTPException(status_code=404, detail="No wishlist found for this user")
 
-    return cart_items
+    return ModelResponse(List[CartOut], cart_items)
 
 
 @app.delete("/user/cart/delete/{cart_id}", tags=["Cart"])
-def delete_cart(
+async def delete_cart(
     cart_id: int,
-    db: Session = Depends(get_db),
+    response: Response,
+    db: AsyncSession = Depends(get_db),
     current_admin: User = Depends(get_current_user)  # wrapper ensures admin role
 ):
-    db_cart = db.query(Cart).filter(Cart.cart_id == cart_id).first()
+    db_cart = await db.scalar(select(Cart).where(Cart.cart_id == cart_id))
     if not db_cart:
         raise HTTPException(status_code=404, detail="Cart not Found...")
     
-    db.delete(db_cart)
-    db.commit()
+    await db.delete(db_cart)
+    await db.commit()
+    cart_changed(response, db_cart.user_id)
     return {"message": f"Cart with ID {cart_id} deleted successfully"}
 
 
+#Orders
+
+async def load_order(db: AsyncSession, order_id: int):
+    return await db.scalar(select(Order).where(Order.order_id == order_id).options(selectinload(Order.lines)))
+
+
+@app.post("/checkout", response_model=OrderOut, tags=["Orders"])
+async def checkout(
+    response: Response,
+    payload: Optional[CheckoutCreate] = None,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    user_id = current_user.user_id
+    try:
+        # Claim the key before touching stock. A retry racing the first
+        # attempt blocks on this insert until that attempt commits (the retry
+        # then replays its order) or rolls back (the retry checks out itself).
+        if idempotency_key:
+            insert = pg_insert if db.bind.dialect.name == "postgresql" else sqlite_insert
+            claimed = await db.scalar(
+                insert(IdempotencyKey)
+                .values(user_id=user_id, key=idempotency_key)
+                .on_conflict_do_nothing()
+                .returning(IdempotencyKey.key)
+            )
+            if claimed is None:
+                order_id = await db.scalar(
+                    select(IdempotencyKey.order_id).where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == idempotency_key)
+                )
+                return await load_order(db, order_id)
+
+        lines = (await db.execute(
+            select(Cart.cart_id, Cart.book_id, Cart.quantity, BookStore.price)
+            .join(BookStore, BookStore.book_id == Cart.book_id)
+            .where(Cart.user_id == user_id)
+            .order_by(Cart.book_id)
+            # A concurrent checkout of the same cart waits here, then finds
+            # it empty once the first one commits.
+            .with_for_update(of=Cart)
+        )).all()
+        if not lines:
+            raise HTTPException(status_code=400, detail="Cart is empty")
+
+        # Stock, the order, the key and the emptied cart commit together: a
+        # 409 on any title rolls back every decrement made before it.
+        await reserve_stock(db, {line.book_id: line.quantity for line in lines})
+        order = Order(
+            user_id=user_id,
+            deliver_address=payload.deliver_address if payload else None,
+            total_quantity=sum(line.quantity for line in lines),
+            total_amount=sum(line.price * line.quantity for line in lines),
+            lines=[
+                OrderLine(book_id=line.book_id, quantity=line.quantity, price_per_book=line.price, line_total=line.price * line.quantity)
+                for line in lines
+            ],
+        )
+        db.add(order)
+        await db.flush()
+        if idempotency_key:
+            await db.execute(
+                update(IdempotencyKey)
+                .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == idempotency_key)
+                .values(order_id=order.order_id)
+            )
+        emptied = await db.execute(
+            delete(Cart)
+            .where(Cart.cart_id.in_([line.cart_id for line in lines]))
+            .execution_options(synchronize_session=False)
+        )
+        # Backends without row locks: a cart someone else already checked
+        # out must not become a second order.
+        if emptied.rowcount != len(lines):
+            raise HTTPException(status_code=409, detail="Cart changed during checkout")
+        await db.commit()
+    except HTTPException:
+        await db.rollback()
+        raise
+
+    # Other users' cached in_stock flags for these titles may now be stale;
+    # CART_SUMMARY_TTL bounds that, checkout itself never trusts them.
+    cart_changed(response, user_id)
+    catalog_cache.invalidate_rows([line.book_id for line in lines])
+    return order
+
+
+@app.get("/users/{user_id}/orders", response_model=OrderPage, tags=["Orders"])
+async def get_order_history(
+    user_id: int,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_user),
+):
+    if current_user.user_id != user_id:
+        raise HTTPException(status_code=403, detail="Not authorized to view these orders")
+
+    # newest first along (user_id, order_id); lines come in one extra query
+    query = select(Order).where(Order.user_id == user_id).options(selectinload(Order.lines))
+    if cursor:
+        last = decode_cursor(cursor, (int,))
+        query = query.where(Order.order_id < last[0])
+
+    orders = (await db.scalars(query.order_by(Order.order_id.desc()).limit(limit + 1))).all()
 
+    next_cursor = None
+    if len(orders) > limit:
+        orders = orders[:limit]
+        next_cursor = encode_cursor([orders[-1].order_id])
 
+    return ModelResponse(OrderPage, {"items": orders, "next_cursor": next_cursor})
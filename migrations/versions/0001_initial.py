@@ -0,0 +1,94 @@
+"""initial schema, as created by create_all() before migrations existed
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+CATEGORY_ENUM = sa.Enum("horror", "sci_Fi", "romance", "history", "adventure", "fantasy", name="categoryenum")
+
+
+def upgrade():
+    op.create_table(
+        "bookstore",
+        sa.Column("book_id", sa.Integer(), primary_key=True),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("author_name", sa.String(), nullable=False),
+        sa.Column("rating", sa.Float(), nullable=False),
+        sa.Column("price", sa.Integer(), nullable=False),
+        sa.Column("cover_photo", sa.String(), nullable=False),
+        sa.Column("categories", CATEGORY_ENUM, nullable=False),
+        sa.Column("stock", sa.Integer(), nullable=False),
+        sa.Column("description", sa.String(), nullable=False),
+        sa.Column("publish_year", sa.Integer(), nullable=False),
+    )
+    op.create_index("ix_bookstore_book_id", "bookstore", ["book_id"])
+
+    op.create_table(
+        "users",
+        sa.Column("user_id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("password", sa.String(), nullable=False),
+        sa.Column("phone", sa.String(), nullable=True),
+        sa.Column("role", sa.String(), nullable=True),
+    )
+    op.create_index("ix_users_user_id", "users", ["user_id"])
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "reviews",
+        sa.Column("review_id", sa.Integer(), primary_key=True),
+        sa.Column("book_id", sa.Integer(), sa.ForeignKey("bookstore.book_id"), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.user_id"), nullable=False),
+        sa.Column("detail", sa.String(), nullable=False),
+        sa.Column("rating", sa.Float(), nullable=False),
+    )
+    op.create_index("ix_reviews_review_id", "reviews", ["review_id"])
+
+    op.create_table(
+        "wishlist_folder",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.user_id"), nullable=False),
+        sa.Column("name", sa.String(), nullable=True),
+        sa.Column("is_default", sa.Boolean(), nullable=True),
+        sa.Column("create_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_wishlist_folder_id", "wishlist_folder", ["id"])
+
+    op.create_table(
+        "wishlist_items",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.user_id"), nullable=False),
+        sa.Column("folder_id", sa.Integer(), sa.ForeignKey("wishlist_folder.id"), nullable=False),
+        sa.Column("book_id", sa.Integer(), sa.ForeignKey("bookstore.book_id"), nullable=False),
+        sa.Column("added_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_wishlist_items_id", "wishlist_items", ["id"])
+
+    op.create_table(
+        "cart",
+        sa.Column("cart_id", sa.Integer(), primary_key=True),
+        sa.Column("book_id", sa.Integer(), sa.ForeignKey("bookstore.book_id"), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.user_id"), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+    )
+    op.create_index("ix_cart_cart_id", "cart", ["cart_id"])
+
+
+def downgrade():
+    op.drop_table("cart")
+    op.drop_table("wishlist_items")
+    op.drop_table("wishlist_folder")
+    op.drop_table("reviews")
+    op.drop_table("users")
+    op.drop_table("bookstore")
+    CATEGORY_ENUM.drop(op.get_bind(), checkfirst=True)
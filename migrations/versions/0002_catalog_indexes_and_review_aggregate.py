@@ -0,0 +1,103 @@
+"""catalog keyset indexes, full-text/trigram search, review aggregate
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+AGGREGATE_COLUMNS = ["review_count", "rating_sum", "average_rating", "rating_1", "rating_2", "rating_3", "rating_4", "rating_5"]
+
+CATALOG_INDEXES = [
+    ("ix_bookstore_price_book_id", ["price", "book_id"]),
+    ("ix_bookstore_rating_book_id", ["rating", "book_id"]),
+    ("ix_bookstore_average_rating_book_id", ["average_rating", "book_id"]),
+    ("ix_bookstore_publish_year_book_id", ["publish_year", "book_id"]),
+    ("ix_bookstore_categories_book_id", ["categories", "book_id"]),
+    ("ix_bookstore_author_name", ["author_name"]),
+]
+
+# Kept in sync with model.BOOK_SEARCH_DDL (copied, so this revision never
+# changes when the model does).
+POSTGRES_SEARCH_DDL = [
+    """
+    ALTER TABLE bookstore ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(author_name, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_bookstore_search_vector ON bookstore USING GIN (search_vector)",
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_bookstore_title_trgm ON bookstore USING GIN (title gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_bookstore_author_name_trgm ON bookstore USING GIN (author_name gin_trgm_ops)",
+]
+
+# Star buckets round half up, matching star_bucket() in main.py.
+BACKFILL_REVIEW_AGGREGATE = """
+UPDATE bookstore SET
+    review_count = agg.review_count,
+    rating_sum = agg.rating_sum,
+    average_rating = agg.rating_sum / agg.review_count,
+    rating_1 = agg.rating_1,
+    rating_2 = agg.rating_2,
+    rating_3 = agg.rating_3,
+    rating_4 = agg.rating_4,
+    rating_5 = agg.rating_5
+FROM (
+    SELECT book_id,
+           count(*) AS review_count,
+           sum(rating) AS rating_sum,
+           sum(CASE WHEN rating < 1.5 THEN 1 ELSE 0 END) AS rating_1,
+           sum(CASE WHEN rating >= 1.5 AND rating < 2.5 THEN 1 ELSE 0 END) AS rating_2,
+           sum(CASE WHEN rating >= 2.5 AND rating < 3.5 THEN 1 ELSE 0 END) AS rating_3,
+           sum(CASE WHEN rating >= 3.5 AND rating < 4.5 THEN 1 ELSE 0 END) AS rating_4,
+           sum(CASE WHEN rating >= 4.5 THEN 1 ELSE 0 END) AS rating_5
+    FROM reviews
+    GROUP BY book_id
+) AS agg
+WHERE bookstore.book_id = agg.book_id
+"""
+
+
+def upgrade():
+    for name in AGGREGATE_COLUMNS:
+        column_type = sa.Float() if name in ("rating_sum", "average_rating") else sa.Integer()
+        op.add_column("bookstore", sa.Column(name, column_type, nullable=False, server_default="0"))
+    op.execute(BACKFILL_REVIEW_AGGREGATE)
+
+    for name, columns in CATALOG_INDEXES:
+        op.create_index(name, "bookstore", columns)
+
+    if op.get_bind().dialect.name == "postgresql":
+        for statement in POSTGRES_SEARCH_DDL:
+            op.execute(statement)
+
+    op.create_index("ix_reviews_book_id_review_id", "reviews", ["book_id", "review_id"])
+    op.create_index("ix_reviews_book_id_rating_review_id", "reviews", ["book_id", "rating", "review_id"])
+
+
+def downgrade():
+    op.drop_index("ix_reviews_book_id_rating_review_id", table_name="reviews")
+    op.drop_index("ix_reviews_book_id_review_id", table_name="reviews")
+
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_bookstore_author_name_trgm")
+        op.execute("DROP INDEX IF EXISTS ix_bookstore_title_trgm")
+        op.execute("DROP INDEX IF EXISTS ix_bookstore_search_vector")
+        op.execute("ALTER TABLE bookstore DROP COLUMN IF EXISTS search_vector")
+
+    for name, _ in reversed(CATALOG_INDEXES):
+        op.drop_index(name, table_name="bookstore")
+
+    with op.batch_alter_table("bookstore") as batch:
+        for name in reversed(AGGREGATE_COLUMNS):
+            batch.drop_column(name)
@@ -0,0 +1,58 @@
+"""foreign-key lookup indexes and one cart row per (user, book)
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+FK_INDEXES = [
+    ("ix_reviews_user_id", "reviews", ["user_id"]),
+    ("ix_wishlist_folder_user_id", "wishlist_folder", ["user_id"]),
+    ("ix_wishlist_items_user_id", "wishlist_items", ["user_id"]),
+    ("ix_wishlist_items_folder_id", "wishlist_items", ["folder_id"]),
+    ("ix_wishlist_items_book_id", "wishlist_items", ["book_id"]),
+    ("ix_cart_book_id", "cart", ["book_id"]),
+]
+
+# Racing add_to_cart calls could leave several rows for the same book: fold
+# them into the oldest row before the unique constraint goes on.
+MERGE_DUPLICATE_CART_ROWS = """
+UPDATE cart SET quantity = (
+    SELECT sum(dup.quantity) FROM cart AS dup
+    WHERE dup.user_id = cart.user_id AND dup.book_id = cart.book_id
+)
+WHERE cart_id IN (
+    SELECT min(cart_id) FROM cart GROUP BY user_id, book_id HAVING count(*) > 1
+)
+"""
+
+DELETE_DUPLICATE_CART_ROWS = """
+DELETE FROM cart WHERE cart_id NOT IN (
+    SELECT min(cart_id) FROM cart GROUP BY user_id, book_id
+)
+"""
+
+
+def upgrade():
+    for name, table, columns in FK_INDEXES:
+        op.create_index(name, table, columns)
+
+    op.execute(MERGE_DUPLICATE_CART_ROWS)
+    op.execute(DELETE_DUPLICATE_CART_ROWS)
+    with op.batch_alter_table("cart") as batch:
+        batch.create_unique_constraint("uq_cart_user_id_book_id", ["user_id", "book_id"])
+
+
+def downgrade():
+    with op.batch_alter_table("cart") as batch:
+        batch.drop_constraint("uq_cart_user_id_book_id", type_="unique")
+
+    for name, table, _ in reversed(FK_INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,56 @@
+"""orders, order lines and checkout idempotency keys
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "orders",
+        sa.Column("order_id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.user_id"), nullable=False),
+        sa.Column("total_quantity", sa.Integer(), nullable=False),
+        sa.Column("total_amount", sa.Integer(), nullable=False),
+        sa.Column("deliver_address", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_orders_order_id", "orders", ["order_id"])
+    op.create_index("ix_orders_user_id_order_id", "orders", ["user_id", "order_id"])
+
+    op.create_table(
+        "order_lines",
+        sa.Column("line_id", sa.Integer(), primary_key=True),
+        sa.Column("order_id", sa.Integer(), sa.ForeignKey("orders.order_id"), nullable=False),
+        sa.Column("book_id", sa.Integer(), sa.ForeignKey("bookstore.book_id"), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column("price_per_book", sa.Integer(), nullable=False),
+        sa.Column("line_total", sa.Integer(), nullable=False),
+    )
+    op.create_index("ix_order_lines_line_id", "order_lines", ["line_id"])
+    op.create_index("ix_order_lines_order_id", "order_lines", ["order_id"])
+    op.create_index("ix_order_lines_book_id", "order_lines", ["book_id"])
+
+    op.create_table(
+        "idempotency_keys",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.user_id"), primary_key=True),
+        sa.Column("key", sa.String(255), primary_key=True),
+        sa.Column("order_id", sa.Integer(), sa.ForeignKey("orders.order_id"), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_idempotency_keys_order_id", "idempotency_keys", ["order_id"])
+
+
+def downgrade():
+    op.drop_table("idempotency_keys")
+    op.drop_table("order_lines")
+    op.drop_table("orders")
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from sqlalchemy import  Integer, Column, String, Float, ForeignKey, Date, DateTime, Enum, Boolean
+from sqlalchemy import  Integer, Column, String, Float, ForeignKey, Date, DateTime, Enum, Boolean, Index, DDL, event, UniqueConstraint
 from sqlalchemy.orm import relationship
 from db import base
 from datetime import datetime
@@ -29,10 +29,62 @@ class BookStore(base):
     stock = Column(Integer, nullable=False)
     description = Column(String, nullable=False)
     publish_year = Column(Integer, nullable=False)
+
+    # Review aggregate, maintained by the review endpoints in the same
+    # transaction as the review write.
+    review_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_sum = Column(Float, nullable=False, default=0.0, server_default="0")
+    average_rating = Column(Float, nullable=False, default=0.0, server_default="0")
+    rating_1 = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_2 = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_3 = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_4 = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_5 = Column(Integer, nullable=False, default=0, server_default="0")
     
     reviews = relationship("Review", back_populates="book", cascade="all, delete-orphan")
     wishlist_items = relationship("WishListItem", back_populates="book")
     cart = relationship("Cart", back_populates="book")
+
+    # keyset pagination: every sortable column is paired with book_id
+    __table_args__ = (
+        Index("ix_bookstore_price_book_id", "price", "book_id"),
+        Index("ix_bookstore_rating_book_id", "rating", "book_id"),
+        Index("ix_bookstore_average_rating_book_id", "average_rating", "book_id"),
+        Index("ix_bookstore_publish_year_book_id", "publish_year", "book_id"),
+        Index("ix_bookstore_categories_book_id", "categories", "book_id"),
+        Index("ix_bookstore_author_name", "author_name"),
+    )
+
+
+# Full-text search. Postgres only, so it lives outside the mapped columns and
+# SQLite (tests) falls back to the in-process index in search.py.
+BOOK_SEARCH_DDL = [
+    """
+    ALTER TABLE bookstore ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(author_name, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_bookstore_search_vector ON bookstore USING GIN (search_vector)",
+    # trigram indexes back the fuzzy autocomplete fallback
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_bookstore_title_trgm ON bookstore USING GIN (title gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_bookstore_author_name_trgm ON bookstore USING GIN (author_name gin_trgm_ops)",
+]
+
+for statement in BOOK_SEARCH_DDL:
+    event.listen(BookStore.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+
+# Created above (and in migration 0002) but not mapped; autogenerate must not
+# mistake them for objects to drop.
+BOOK_SEARCH_OBJECTS = {
+    "search_vector",
+    "ix_bookstore_search_vector",
+    "ix_bookstore_title_trgm",
+    "ix_bookstore_author_name_trgm",
+}
     
 class User(base):
     __tablename__ = "users"
@@ -48,6 +100,7 @@ class User(base):
     wishlist_items = relationship("WishListItem", back_populates="user")
     folders = relationship("WishListFolder", back_populates="user")
     cart = relationship("Cart", back_populates="user")
+    orders = relationship("Order", back_populates="user")
     
     
 # class Admin(base):
@@ -66,12 +119,18 @@ class Review(base):
     
     review_id = Column(Integer, primary_key=True, index=True)
     book_id = Column(Integer, ForeignKey("bookstore.book_id"), nullable=False)
-    user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False, index=True)
     detail = Column(String, nullable=False)
     rating = Column(Float, nullable=False)
     
     book = relationship("BookStore", back_populates="reviews")
     user = relationship("User", back_populates="reviews")
+
+    # per-book listing, newest first or by rating, paged by review_id
+    __table_args__ = (
+        Index("ix_reviews_book_id_review_id", "book_id", "review_id"),
+        Index("ix_reviews_book_id_rating_review_id", "book_id", "rating", "review_id"),
+    )
     
     
 # class WishList(base):
@@ -89,7 +148,7 @@ class WishListFolder(base):
     __tablename__ = "wishlist_folder"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False, index=True)
     name = Column(String, nullable=True) 
     is_default = Column(Boolean, default=False)
     create_at = Column(DateTime, default=datetime.utcnow)
@@ -101,9 +160,9 @@ class WishListItem(base):
     __tablename__ = "wishlist_items"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
-    folder_id = Column(Integer, ForeignKey("wishlist_folder.id"), nullable=False)
-    book_id = Column(Integer, ForeignKey(BookStore.book_id), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False, index=True)
+    folder_id = Column(Integer, ForeignKey("wishlist_folder.id"), nullable=False, index=True)
+    book_id = Column(Integer, ForeignKey(BookStore.book_id), nullable=False, index=True)
     added_at = Column(DateTime, default=datetime.utcnow)
     
     user = relationship("User", back_populates="wishlist_items")
@@ -115,27 +174,59 @@ class Cart(base):
     __tablename__ = "cart"
     
     cart_id = Column(Integer, primary_key=True, index=True)
-    book_id = Column(Integer, ForeignKey("bookstore.book_id"), nullable=False)
+    book_id = Column(Integer, ForeignKey("bookstore.book_id"), nullable=False, index=True)
     user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
     quantity = Column(Integer, nullable=False, default=1)
     
     book = relationship("BookStore", back_populates="cart")
     user = relationship("User", back_populates="cart")
 
- 
-# class Booking(base):
-#     __tablename__ = "booking"
-    
-#     booking_id = Column(Integer, primary_key=True, index=True)
-#     book_id = Column(Integer, ForeignKey("bookstore.book_id"), nullable=False)
-#     user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
-#     quantity = Column(Integer, nullable=False)
-#     booking_date = Column(Date, nullable=False, default=datetime.utcnow().date)
-#     return_date = Column(Date, nullable=True)
-#     price_per_book = Column(Float, nullable=False)
-#     total_amount = Column(Float, nullable=False)
-#     deliver_address = Column(String, nullable=False)
-    
-#     book = relationship("BookStore", back_populates="booking")
-#     user = relationship("User", back_populates="booking")   
-    
\ No newline at end of file
+    # one row per (user, book); also serves per-user cart lookups
+    __table_args__ = (
+        UniqueConstraint("user_id", "book_id", name="uq_cart_user_id_book_id"),
+    )
+
+
+class Order(base):
+    __tablename__ = "orders"
+
+    order_id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
+    total_quantity = Column(Integer, nullable=False)
+    total_amount = Column(Integer, nullable=False)
+    deliver_address = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    user = relationship("User", back_populates="orders")
+    lines = relationship("OrderLine", back_populates="order", cascade="all, delete-orphan", order_by="OrderLine.book_id")
+
+    # per-user order history, newest first, paged by order_id
+    __table_args__ = (
+        Index("ix_orders_user_id_order_id", "user_id", "order_id"),
+    )
+
+
+class OrderLine(base):
+    __tablename__ = "order_lines"
+
+    line_id = Column(Integer, primary_key=True, index=True)
+    order_id = Column(Integer, ForeignKey("orders.order_id"), nullable=False, index=True)
+    book_id = Column(Integer, ForeignKey("bookstore.book_id"), nullable=False, index=True)
+    quantity = Column(Integer, nullable=False)
+    # price at checkout time; later catalog edits don't rewrite old orders
+    price_per_book = Column(Integer, nullable=False)
+    line_total = Column(Integer, nullable=False)
+
+    order = relationship("Order", back_populates="lines")
+    book = relationship("BookStore")
+
+
+class IdempotencyKey(base):
+    # One row per (user, Idempotency-Key header) that produced an order,
+    # written in the same transaction as the order itself.
+    __tablename__ = "idempotency_keys"
+
+    user_id = Column(Integer, ForeignKey("users.user_id"), primary_key=True)
+    key = Column(String(255), primary_key=True)
+    order_id = Column(Integer, ForeignKey("orders.order_id"), nullable=True, index=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
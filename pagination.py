@@ -0,0 +1,35 @@
+import base64
+import json
+import math
+
+from fastapi import HTTPException
+
+
+# Opaque keyset cursors: the client just hands back what we gave it.
+
+def encode_cursor(values: list) -> str:
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _matches(value, python_type) -> bool:
+    # JSON has one number type: a float key may come back as 1 rather than 1.0
+    if isinstance(value, bool):
+        return False
+    if python_type is float:
+        return isinstance(value, (int, float)) and math.isfinite(value)
+    return isinstance(value, python_type)
+
+
+def decode_cursor(cursor: str, types: tuple) -> list:
+    # types: the Python type of each key column, e.g. (float, int)
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(types):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not all(_matches(value, python_type) for value, python_type in zip(values, types)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional
+from pydantic import BaseModel, EmailStr, Field, computed_field
+from typing import Optional, List, Dict
 from datetime import datetime
 
 
@@ -15,6 +15,19 @@ class BookCreate(BaseModel):
     stock: int
     description: str
     publish_year: int
+
+
+class BookImportError(BaseModel):
+    line: int
+    error: str
+
+
+class BookImportReport(BaseModel):
+    imported: int
+    rejected: int
+    errors: List[BookImportError]
+    errors_truncated: bool = False
+
     
 class Book(BaseModel):
     title: str
@@ -30,6 +43,7 @@ class Book(BaseModel):
     
 
 class BookOut(BaseModel):
+    book_id: int
     title: str
     author_name: str
     rating: float
@@ -40,8 +54,49 @@ class BookOut(BaseModel):
     stock: int
     description: str
     publish_year: int
+
+    review_count: int = 0
+    average_rating: float = 0.0
+    rating_1: int = Field(0, exclude=True)
+    rating_2: int = Field(0, exclude=True)
+    rating_3: int = Field(0, exclude=True)
+    rating_4: int = Field(0, exclude=True)
+    rating_5: int = Field(0, exclude=True)
+
+    @computed_field
+    @property
+    def rating_histogram(self) -> Dict[str, int]:
+        return {str(star): getattr(self, f"rating_{star}") for star in range(1, 6)}
     
     model_config = {"from_attributes" : True}
+    
+
+class BookPage(BaseModel):
+    items: List[BookOut]
+    next_cursor: Optional[str] = None
+
+
+class BookSearchHit(BookOut):
+    rank: float
+    snippet: Optional[str] = None
+
+
+class BookSearchPage(BaseModel):
+    items: List[BookSearchHit]
+    next_cursor: Optional[str] = None
+
+
+class AutocompleteSuggestion(BaseModel):
+    text: str
+    kind: str
+    book_count: int
+
+
+class BookFacets(BaseModel):
+    total: int
+    categories: Dict[str, int]
+    price: Dict[str, int]
+    decades: Dict[str, int]
   
     
 #Users
@@ -96,6 +151,10 @@ class ReviewCreate(BaseModel):
     detail: str
     rating: float
     
+class ReviewUpdate(BaseModel):
+    detail: Optional[str] = None
+    rating: Optional[float] = None
+    
 class ReviewOut(BaseModel):
     review_id: int
     detail: str
@@ -104,6 +163,11 @@ class ReviewOut(BaseModel):
     model_config = {
         "from_attributes": True
     }
+
+
+class ReviewPage(BaseModel):
+    items: List[ReviewOut]
+    next_cursor: Optional[str] = None
     
     
     
@@ -172,6 +236,34 @@ class ItemOut(BaseModel):
     book_id: Optional[int]
     folder_id: int
     added_at: datetime
+
+
+class WishListBook(BaseModel):
+    book_id: int
+    title: str
+    author_name: str
+    price: int
+    cover_photo: str
+    stock: int
+    average_rating: float = 0.0
+
+    model_config = {
+        "from_attributes": True
+    }
+
+
+class WishListItemFull(BaseModel):
+    id: int
+    added_at: datetime
+    book: WishListBook
+
+    model_config = {
+        "from_attributes": True
+    }
+
+
+class FolderFull(FolderOut):
+    items: List[WishListItemFull]
     
     
 #Cart  
@@ -189,4 +281,64 @@ class CartOut(BaseModel):
     model_config = {
         "from_attributes": True
     }
+
+
+class CartSummaryLine(BaseModel):
+    cart_id: int
+    book_id: int
+    title: str
+    price: int
+    quantity: int
+    line_total: int
+    in_stock: bool
+
+
+class CartSummary(BaseModel):
+    user_id: int
+    items: List[CartSummaryLine]
+    total_quantity: int
+    grand_total: int
+
+
+class CheckoutCreate(BaseModel):
+    deliver_address: Optional[str] = None
+
+
+class OrderLineOut(BaseModel):
+    book_id: int
+    quantity: int
+    price_per_book: int
+    line_total: int
+
+    model_config = {
+        "from_attributes": True
+    }
+
+
+class OrderOut(BaseModel):
+    order_id: int
+    user_id: int
+    total_quantity: int
+    total_amount: int
+    deliver_address: Optional[str] = None
+    created_at: datetime
+    lines: List[OrderLineOut]
+
+    model_config = {
+        "from_attributes": True
+    }
+
+
+class OrderPage(BaseModel):
+    items: List[OrderOut]
+    next_cursor: Optional[str] = None
+
+
+class CartItemChange(BaseModel):
+    book_id: int
+    quantity: int = Field(..., ge=0)  # 0 removes the book from the cart
+
+
+class CartBatchUpdate(BaseModel):
+    items: List[CartItemChange] = Field(..., max_length=500)
     
\ No newline at end of file
@@ -0,0 +1,340 @@
+import bisect
+import difflib
+import heapq
+import re
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import select, text
+from starlette.concurrency import run_in_threadpool
+
+from cache import ensure_fresh
+from model import BookStore
+
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Same relative weights Postgres gives the A/B/C labels in ts_rank_cd.
+FIELD_WEIGHTS = {"title": 1.0, "author_name": 0.4, "description": 0.2}
+
+# shorter prefixes would match most of the vocabulary
+PREFIX_MIN_LENGTH = 3
+
+
+def tokenize(value: str):
+    return TOKEN_RE.findall((value or "").lower())
+
+
+def query_terms(q: str):
+    # [(term, is_prefix)]: only the last word can still be being typed
+    terms = tokenize(q)
+    return [
+        (term, i == len(terms) - 1 and len(term) >= PREFIX_MIN_LENGTH)
+        for i, term in enumerate(terms)
+    ]
+
+
+def to_prefix_tsquery(q: str) -> str:
+    # "lord of the rin" -> "lord & of & the & rin:*"
+    return " & ".join(f"{term}:*" if is_prefix else term for term, is_prefix in query_terms(q))
+
+
+# Postgres
+
+PG_SEARCH_SQL = """
+WITH q AS (SELECT to_tsquery('english', :tsquery) AS query),
+hits AS (
+    SELECT b.book_id, ts_rank_cd(b.search_vector, q.query) AS rank
+    FROM bookstore b, q
+    WHERE b.search_vector @@ q.query
+    {after}
+    ORDER BY rank DESC, b.book_id
+    LIMIT :limit
+)
+SELECT {columns}, hits.rank AS rank,
+       ts_headline('english', b.description, q.query, 'MaxFragments=1, MaxWords=20, MinWords=5') AS snippet
+FROM hits JOIN bookstore b ON b.book_id = hits.book_id, q
+ORDER BY hits.rank DESC, hits.book_id
+"""
+
+PG_AFTER_SQL = """
+    AND (ts_rank_cd(b.search_vector, q.query) < CAST(:rank AS real)
+         OR (ts_rank_cd(b.search_vector, q.query) = CAST(:rank AS real) AND b.book_id > :book_id))
+"""
+
+
+async def pg_search(db, q: str, columns, limit: int, after=None):
+    tsquery = to_prefix_tsquery(q)
+    if not tsquery:
+        return []
+    sql = PG_SEARCH_SQL.format(
+        columns=", ".join(f"b.{name}" for name in columns),
+        after=PG_AFTER_SQL if after else "",
+    )
+    params = {"tsquery": tsquery, "limit": limit}
+    if after:
+        params.update(rank=after[0], book_id=after[1])
+    result = await db.execute(text(sql), params)
+    return result.mappings().all()
+
+
+# In-process fallback for SQLite (tests, local runs)
+
+class InvertedIndex:
+    def __init__(self):
+        self.postings = defaultdict(dict)  # term -> {book_id: weight}
+        self.terms = []  # sorted, for prefix lookups with bisect
+        self.docs = {}  # book_id -> {field: text}
+        self.ready = False
+        self._lock = threading.Lock()
+
+    def _add(self, book_id: int, fields: dict):
+        self.docs[book_id] = fields
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(fields.get(field)):
+                postings = self.postings[term]
+                if not postings:
+                    bisect.insort(self.terms, term)
+                postings[book_id] = postings.get(book_id, 0.0) + weight
+
+    def _remove(self, book_id: int):
+        fields = self.docs.pop(book_id, None)
+        if fields is None:
+            return
+        for field in FIELD_WEIGHTS:
+            for term in tokenize(fields.get(field)):
+                postings = self.postings.get(term)
+                if postings and postings.pop(book_id, None) is not None and not postings:
+                    del self.postings[term]
+                    i = bisect.bisect_left(self.terms, term)
+                    if i < len(self.terms) and self.terms[i] == term:
+                        self.terms.pop(i)
+
+    def load(self, rows):
+        with self._lock:
+            self.postings.clear()
+            self.terms = []
+            self.docs.clear()
+            for row in rows:
+                self._add(row.book_id, {field: getattr(row, field) for field in FIELD_WEIGHTS})
+            self.ready = True
+
+    def upsert(self, book_id: int, **fields):
+        if not self.ready:
+            return
+        with self._lock:
+            self._remove(book_id)
+            self._add(book_id, fields)
+
+    def remove(self, book_id: int):
+        if not self.ready:
+            return
+        with self._lock:
+            self._remove(book_id)
+
+    def _prefix_scores(self, prefix: str) -> dict:
+        scores = {}
+        i = bisect.bisect_left(self.terms, prefix)
+        while i < len(self.terms) and self.terms[i].startswith(prefix):
+            for book_id, weight in self.postings[self.terms[i]].items():
+                scores[book_id] = scores.get(book_id, 0.0) + weight
+            i += 1
+        return scores
+
+    def search(self, q: str, limit: int, after=None):
+        terms = query_terms(q)
+        if not terms:
+            return []
+        with self._lock:
+            scores = None
+            for term, is_prefix in terms:
+                matches = self._prefix_scores(term) if is_prefix else dict(self.postings.get(term, {}))
+                if scores is None:
+                    scores = matches
+                else:
+                    scores = {book_id: scores[book_id] + s for book_id, s in matches.items() if book_id in scores}
+                if not scores:
+                    return []
+
+        hits = sorted(((-rank, book_id) for book_id, rank in scores.items()))
+        if after:
+            hits = [h for h in hits if h > (-after[0], after[1])]
+        return [(-neg_rank, book_id) for neg_rank, book_id in hits[:limit]]
+
+    def snippet(self, book_id: int, q: str, words: int = 20) -> str:
+        description = self.docs.get(book_id, {}).get("description") or ""
+        terms = query_terms(q)
+        tokens = description.split()
+
+        def matches(token):
+            word = token.lower().strip(".,;:!?\"'()")
+            return any(word.startswith(term) if is_prefix else word == term for term, is_prefix in terms)
+
+        start = 0
+        for i, token in enumerate(tokens):
+            if matches(token):
+                start = max(0, i - words // 4)
+                break
+        picked = []
+        for token in tokens[start:start + words]:
+            if matches(token):
+                token = f"<b>{token}</b>"
+            picked.append(token)
+        return " ".join(picked)
+
+
+search_index = InvertedIndex()
+
+
+async def ensure_search_index(db):
+    if not search_index.ready:
+        rows = (await db.execute(select(BookStore.book_id, *[getattr(BookStore, f) for f in FIELD_WEIGHTS]))).all()
+        search_index.load(rows)
+    return search_index
+
+
+# Autocomplete: every word start of every title and author name, kept as a
+# sorted array so a prefix lookup is a bisect plus a short scan.
+
+AUTOCOMPLETE_SCAN_LIMIT = 500
+LOAD_SORT_SLICE = 20000
+
+
+class PrefixIndex:
+    def __init__(self):
+        self.keys = []  # sorted (key, kind, text)
+        self.counts = {}  # (kind, text) -> number of books carrying it
+        self.books = {}  # book_id -> (title, author_name)
+        self.ready = False
+        self.loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _keys_for(kind: str, value: str):
+        words = tokenize(value)
+        return [(" ".join(words[i:]), kind, value) for i in range(len(words))]
+
+    def _add_value(self, kind: str, value: str):
+        if not value:
+            return
+        count = self.counts.get((kind, value), 0)
+        self.counts[(kind, value)] = count + 1
+        if count == 0:
+            for key in self._keys_for(kind, value):
+                bisect.insort(self.keys, key)
+
+    def _remove_value(self, kind: str, value: str):
+        count = self.counts.get((kind, value), 0)
+        if count > 1:
+            self.counts[(kind, value)] = count - 1
+            return
+        self.counts.pop((kind, value), None)
+        for key in self._keys_for(kind, value):
+            i = bisect.bisect_left(self.keys, key)
+            if i < len(self.keys) and self.keys[i] == key:
+                self.keys.pop(i)
+
+    def _add_book(self, book_id: int, title: str, author_name: str):
+        self.books[book_id] = (title, author_name)
+        self._add_value("title", title)
+        self._add_value("author", author_name)
+
+    def _remove_book(self, book_id: int):
+        previous = self.books.pop(book_id, None)
+        if previous is not None:
+            self._remove_value("title", previous[0])
+            self._remove_value("author", previous[1])
+
+    def load(self, rows, loaded_at: float):
+        # runs off the event loop (see load_prefix_index)
+        keys, counts, books = [], {}, {}
+        for row in rows:
+            books[row.book_id] = (row.title, row.author_name)
+            for kind, value in (("title", row.title), ("author", row.author_name)):
+                if not value:
+                    continue
+                counts[(kind, value)] = counts.get((kind, value), 0) + 1
+                if counts[(kind, value)] == 1:
+                    keys.extend(self._keys_for(kind, value))
+        # Sorted in slices and merged: one big list.sort() would hold the GIL,
+        # and so block the event loop, for the whole sort.
+        slices = [sorted(keys[i:i + LOAD_SORT_SLICE]) for i in range(0, len(keys), LOAD_SORT_SLICE)]
+        keys = list(heapq.merge(*slices))
+        with self._lock:
+            self.keys, self.counts, self.books = keys, counts, books
+            self.ready = True
+            self.loaded_at = loaded_at
+
+    def upsert(self, book_id: int, title: str, author_name: str):
+        if not self.ready:
+            return
+        with self._lock:
+            self._remove_book(book_id)
+            self._add_book(book_id, title, author_name)
+
+    def remove(self, book_id: int):
+        if not self.ready:
+            return
+        with self._lock:
+            self._remove_book(book_id)
+
+    def complete(self, q: str, k: int):
+        prefix = " ".join(tokenize(q))
+        if not prefix:
+            return []
+        seen = {}
+        with self._lock:
+            i = bisect.bisect_left(self.keys, (prefix,))
+            end = min(len(self.keys), i + AUTOCOMPLETE_SCAN_LIMIT)
+            while i < end and self.keys[i][0].startswith(prefix):
+                _, kind, value = self.keys[i]
+                seen[(kind, value)] = self.counts.get((kind, value), 0)
+                i += 1
+        # books-per-suggestion first (prolific authors), then alphabetical
+        ranked = sorted(seen.items(), key=lambda item: (-item[1], item[0][1]))
+        return [{"text": value, "kind": kind, "book_count": count} for (kind, value), count in ranked[:k]]
+
+    def fuzzy(self, q: str, k: int):
+        # SQLite stand-in for pg_trgm similarity
+        with self._lock:
+            candidates = {value.lower(): (kind, value) for kind, value in self.counts}
+        matches = difflib.get_close_matches(q.lower(), list(candidates), n=k, cutoff=0.6)
+        return [
+            {"text": candidates[m][1], "kind": candidates[m][0], "book_count": self.counts.get(candidates[m], 0)}
+            for m in matches
+        ]
+
+
+PG_FUZZY_SQL = """
+SELECT text, kind, count(*) AS book_count, max(score) AS score FROM (
+    SELECT title AS text, 'title' AS kind, similarity(title, :q) AS score
+    FROM bookstore WHERE title % :q
+    UNION ALL
+    SELECT author_name AS text, 'author' AS kind, similarity(author_name, :q) AS score
+    FROM bookstore WHERE author_name % :q
+) matches
+GROUP BY text, kind
+ORDER BY score DESC, book_count DESC
+LIMIT :k
+"""
+
+
+async def pg_fuzzy_complete(db, q: str, k: int):
+    result = await db.execute(text(PG_FUZZY_SQL), {"q": q, "k": k})
+    return [{"text": row.text, "kind": row.kind, "book_count": row.book_count} for row in result]
+
+
+prefix_index = PrefixIndex()
+
+
+async def load_prefix_index(db):
+    rows = (await db.execute(select(BookStore.book_id, BookStore.title, BookStore.author_name))).all()
+    # Tokenizing and sorting millions of keys would stall the event loop for
+    # seconds; load() builds the new arrays on a worker thread and only
+    # takes the lock to swap them in.
+    await run_in_threadpool(prefix_index.load, rows, time.monotonic())
+
+
+async def ensure_prefix_index(db, session_factory, max_age: float):
+    return await ensure_fresh(prefix_index, load_prefix_index, db, session_factory, max_age)
@@ -0,0 +1,90 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+# SQLite stands in for Postgres; must be set before db.py builds the engine.
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import db as database
+import main
+from model import BookStore, User, WishListFolder, WishListItem
+
+
+async def seed(folders: int, items_per_folder: int):
+    async with database.engine.begin() as connection:
+        await connection.run_sync(database.base.metadata.drop_all)
+        await connection.run_sync(database.base.metadata.create_all)
+    async with database.AsyncSessionLocal() as session:
+        user = User(name="reader", email="reader@example.com", password="x", role="User")
+        session.add(user)
+        await session.flush()
+        for f in range(folders):
+            folder = WishListFolder(user_id=user.user_id, name=f"folder {f}")
+            session.add(folder)
+            await session.flush()
+            for i in range(items_per_folder):
+                book = BookStore(
+                    title=f"book {f}-{i}", author_name="author", rating=4.0, price=10,
+                    cover_photo="uploads/cover.jpg", categories="horror", stock=1,
+                    description="d", publish_year=2000,
+                )
+                session.add(book)
+                await session.flush()
+                session.add(WishListItem(user_id=user.user_id, folder_id=folder.id, book_id=book.book_id))
+        await session.commit()
+        user_id = user.user_id
+    # the test client runs its own event loop
+    await database.engine.dispose()
+    return user_id
+
+
+@pytest.fixture
+def client():
+    main.app.dependency_overrides[main.get_current_user] = lambda: None
+    with TestClient(main.app) as test_client:
+        yield test_client
+    main.app.dependency_overrides.clear()
+    asyncio.run(database.engine.dispose())
+
+
+def count_statements(client, url):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(database.engine.sync_engine, "before_cursor_execute", record)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(database.engine.sync_engine, "before_cursor_execute", record)
+    return response, statements
+
+
+@pytest.mark.parametrize("folders, items_per_folder", [(1, 1), (4, 3), (10, 20)])
+def test_full_wishlist_query_count_is_bounded(client, folders, items_per_folder):
+    user_id = asyncio.run(seed(folders, items_per_folder))
+
+    response, statements = count_statements(client, f"/user/{user_id}/wishlist/full")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert len(body) == folders
+    assert all(len(folder["items"]) == items_per_folder for folder in body)
+    assert all(item["book"]["title"].startswith("book ") for folder in body for item in folder["items"])
+    assert len(statements) <= 3
+
+
+def test_full_wishlist_unknown_user(client):
+    asyncio.run(seed(0, 0))
+
+    response, statements = count_statements(client, "/user/999/wishlist/full")
+
+    assert response.status_code == 404
+    assert len(statements) <= 3